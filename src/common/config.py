@@ -12,7 +12,7 @@ GEN_IMG_DESCRIPTIONS = 1
 IMG_DESC_PROMPT = (
     "Analyze this image and extract metadata for a search index. "
     "Return ONLY a valid JSON object with NO additional text. "
-    "List at most 5 items per category. Categories are 'objects', ",
+    "List at most 5 items per category. Categories are 'objects', "
     "'materials', 'setting', and 'visual_attributes'. "
     "Avoid repetition.\n In the following schema, the information in "
     "brackets are examples; feel free to insert your own there.\n"
@@ -63,7 +63,7 @@ COLLECTION_NAME = "photo_embeddings"
 # Qdrant settings
 QDRANT_HOST = "localhost"
 QDRANT_PORT = 6333
-EMBEDDING_DIM = 3584  # Llama 3.2-Vision 11B embedding dimension
+QDRANT_GRPC_PORT = 6334
 
 # Model settings
 MODEL_CACHE_DIR = "/data/huggingface"
@@ -71,12 +71,23 @@ MODEL_NAME = "meta-llama/Llama-3.2-11B-Vision-Instruct"
 MODEL_PATH = "/data/huggingface/hub/models--meta-llama--Llama-3.2-11B-Vision-Instruct/snapshots/9eb2daaa8597bf192a8b0e73f848f3a102794df5"
 DEVICE = "cuda"  # Use GPU
 BATCH_SIZE = 8  # Adjust based on VRAM
+COMPILE_VISION_MODEL = True  # torch.compile the vision encoder on CUDA
+# Weight quantization: None (bf16), 'int8' (bitsandbytes, whole model),
+# or 'fp8' (torchao, vision encoder only). Embeddings from a quantized
+# model differ slightly, so re-index after changing this.
+QUANTIZATION = None
 EMBEDDING_DIM = 7680  # Llama 3.2-Vision 11B output dimension
 OUTPUT_TOKENS = 150
 
-# File extensions to process
-IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.heic', '.HEIC', '.JPG', '.JPEG'}
-VIDEO_EXTENSIONS = {'.mp4', '.mov', '.avi', '.MP4', '.MOV', '.AVI'}
+# Face model settings
+# Run the InsightFace models through TensorRT in FP16 when onnxruntime
+# has the TensorRT provider; engines are cached under INSIGHTFACE_HOME
+FACE_TRT_FP16 = True
+
+# File extensions to process. Lowercase only: callers compare
+# against path.suffix.lower(), so any capitalization matches.
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.heic'})
+VIDEO_EXTENSIONS = frozenset({'.mp4', '.mov', '.avi'})
 
 # Geocoding
 GEOCODING_USER_AGENT = "photo_indexer"
@@ -5,12 +5,15 @@
 # @Last Modified time: 2025-12-07 10:51:12
 
 
+import json
 import os
 from pathlib import Path
 from tempfile import TemporaryDirectory
 import unittest
+from unittest.mock import patch
 
-from common.utils import FileNamer
+from common import utils
+from common.utils import FileNamer, Utils
 
 
 class UtilsTester(unittest.TestCase):
@@ -43,6 +46,40 @@ class UtilsTester(unittest.TestCase):
             self.assertTrue(Path.exists(full_path))
             self.assertTrue(os.path.exists(f"{root}/my_file_1.txt"))
 
+    def test_json_round_trip(self):
+        obj = {'objects': ['bag', 'cable'], 'gps': {'latitude': 37.42}, 'n': None}
+        pretty = Utils.json_dumps_pretty(obj)
+        self.assertIn('\n  "objects"', pretty)
+        self.assertEqual(Utils.json_loads(pretty), obj)
+
+        # Non-string keys become strings, as with the json module:
+        self.assertEqual(Utils.json_loads(Utils.json_dumps_pretty({271: 'Apple'})),
+                         {'271': 'Apple'})
+
+        self.assertNotIn('\n', Utils.json_dumps(obj))
+        self.assertEqual(Utils.json_loads(Utils.json_dumps(obj)), obj)
+
+        with self.assertRaises(json.JSONDecodeError):
+            Utils.json_loads('Objects: a bag')
+
+    def test_photo_guid_cache(self):
+        with TemporaryDirectory(dir='/tmp', prefix='guid_cache_') as root:
+            guid_cache = utils._GuidCache(Path(root) / 'guids.db')
+            photo = Path(root) / 'photo.jpg'
+            photo.write_bytes(b'photo content')
+            with patch.object(utils, '_guid_cache', guid_cache), \
+                 patch.object(Utils, '_hash_photo', wraps=Utils._hash_photo) as hash_photo:
+                guid = Utils.get_photo_guid(photo)
+                self.assertEqual(len(guid), 16)
+                self.assertEqual(Utils.get_photo_guid(photo), guid)
+                self.assertEqual(hash_photo.call_count, 1)
+
+                # Changed content is hashed again:
+                photo.write_bytes(b'other photo content')
+                self.assertNotEqual(Utils.get_photo_guid(photo), guid)
+                self.assertEqual(hash_photo.call_count, 2)
+            guid_cache.close()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -8,9 +8,26 @@ from pathlib import Path
 import time
 from datetime import datetime, timedelta
 
+import atexit
 from contextlib import contextmanager
 import hashlib
-from typing import Callable
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Optional
+
+try:
+    # Faster JSON parsing and serialization, if available
+    import orjson
+except ImportError:
+    orjson = None
+
+# Persistent cache of photo GUIDs keyed by path, size, and
+# modification time, so unchanged files are not re-hashed
+GUID_CACHE_PATH = Path.home() / ".photo_index" / "guids.db"
+# Cache writes are committed in groups of this many
+GUID_CACHE_COMMIT_EVERY = 256
 
 # --------------------- Context Managers ----------------
 
@@ -213,6 +230,80 @@ class FileNamer:
         self.cwd = Path(new_dir)
         return self.cwd
 
+# ---------------------- Class _GuidCache -------------------
+
+class _GuidCache:
+    """SQLite table of photo GUIDs by (path, size, mtime_ns).
+
+    A lookup hits only while the file's size and modification time
+    are unchanged. The database is opened on first use; if it cannot
+    be opened, every lookup misses.
+    """
+
+    def __init__(self, cache_path: Path):
+        self.cache_path = Path(cache_path)
+        self._db = None
+        self._unavailable = False
+        self._lock = threading.Lock()
+        self._pending_writes = 0
+
+    def _connect(self) -> bool:
+        """Open the database if needed; False if it is unavailable."""
+        if self._db is not None:
+            return True
+        if self._unavailable:
+            return False
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.cache_path), check_same_thread=False)
+            # WAL lets other processes read while this one writes
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS guids "
+                             "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, guid TEXT)")
+            self._db.commit()
+        except (OSError, sqlite3.Error) as e:
+            print(f"GUID cache {self.cache_path} unavailable ({e}); hashing every photo")
+            self._db = None
+            self._unavailable = True
+            return False
+        atexit.register(self.close)
+        return True
+
+    def get(self, path: str, size: int, mtime_ns: int) -> Optional[str]:
+        """The cached GUID of an unchanged file; None on a miss."""
+        with self._lock:
+            if not self._connect():
+                return None
+            row = self._db.execute("SELECT guid FROM guids WHERE path = ? AND size = ? AND mtime_ns = ?",
+                                   (path, size, mtime_ns)).fetchone()
+        return row[0] if row else None
+
+    def put(self, path: str, size: int, mtime_ns: int, guid: str):
+        """Record a file's GUID, committing in groups."""
+        with self._lock:
+            if not self._connect():
+                return
+            self._db.execute("INSERT OR REPLACE INTO guids (path, size, mtime_ns, guid) VALUES (?, ?, ?, ?)",
+                             (path, size, mtime_ns, guid))
+            self._pending_writes += 1
+            if self._pending_writes >= GUID_CACHE_COMMIT_EVERY:
+                self._db.commit()
+                self._pending_writes = 0
+
+    def close(self):
+        """Commit pending writes and close the database."""
+        with self._lock:
+            if self._db is None:
+                return
+            if self._pending_writes:
+                self._db.commit()
+                self._pending_writes = 0
+            self._db.close()
+            self._db = None
+
+
+_guid_cache = _GuidCache(GUID_CACHE_PATH)
+
 # ---------------------- Class Utils -------------------
 
 class Utils:
@@ -223,7 +314,9 @@ class Utils:
         """Generate stable GUID based on file content.
         
         Uses SHA256 hash of file content, so the same photo will always
-        have the same GUID, even if renamed or moved.
+        have the same GUID, even if renamed or moved. GUIDs are cached
+        on disk by path, size, and modification time, so an unchanged
+        file is hashed only once across runs.
         
         Args:
             photo_path: Path to photo file
@@ -231,6 +324,17 @@ class Utils:
         Returns:
             16-character hex string (64 bits)
         """
+        path = os.path.abspath(photo_path)
+        stat = os.stat(path)
+        guid = _guid_cache.get(path, stat.st_size, stat.st_mtime_ns)
+        if guid is None:
+            guid = Utils._hash_photo(path)
+            _guid_cache.put(path, stat.st_size, stat.st_mtime_ns, guid)
+        return guid
+
+    @staticmethod
+    def _hash_photo(photo_path) -> str:
+        """The GUID of a photo, computed from its content."""
         hasher = hashlib.sha256()
         with open(photo_path, 'rb') as f:
             # Read in chunks for memory efficiency
@@ -251,6 +355,41 @@ class Utils:
         """
         return int(guid, 16) % (2**63)
 
+    # ---------------------- JSON -------------------------
+
+    @staticmethod
+    def json_loads(json_str: str | bytes) -> Any:
+        """Parse JSON, using orjson when it is installed.
+        
+        Raises:
+            json.JSONDecodeError on malformed input (orjson's
+            decode error is a subclass of it)
+        """
+        if orjson is not None:
+            return orjson.loads(json_str)
+        return json.loads(json_str)
+
+    @staticmethod
+    def json_dumps(obj: Any) -> str:
+        """Serialize obj as compact JSON, using orjson when it is installed."""
+        if orjson is not None:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+        return json.dumps(obj)
+
+    @staticmethod
+    def json_dumps_pretty(obj: Any) -> str:
+        """Serialize obj as JSON indented by two spaces.
+        
+        Uses orjson when it is installed. Non-string dict keys are
+        converted to strings, as the stdlib json module does.
+        """
+        if orjson is not None:
+            return orjson.dumps(
+                obj, 
+                option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+            ).decode()
+        return json.dumps(obj, indent=2)
+
     # ---------------------- JSON Fixing -------------------------
 
     @staticmethod
@@ -19,6 +19,7 @@ This tool uses PySceneDetect to analyze video content and provides:
 import argparse
 import csv
 import sys
+import threading
 from datetime import timedelta
 from pathlib import Path
 from typing import List, Tuple, Optional
@@ -41,14 +42,23 @@ from logging_service import LoggingService
 
 from movie_processing.scene_change_detector import SceneChangeDetector
 
+# Scene and stats managers are reused across the videos
+# analyzed by one thread (see MovieAnalyzer._get_scene_manager()):
+_thread_cache = threading.local()
+
 class MovieAnalyzer:
     """Analyze scene detection metrics for video files."""
+
+    # Candidate content_val thresholds scanned when estimating
+    # a per-video scene change threshold (see estimate_threshold()):
+    THRESHOLD_CANDIDATES = np.arange(15, 50, 1.0)
     
     def __init__(self, 
                  video_path: str, 
                  scenecount_max_absolute: int | None = None, 
                  scenecount_max_per_minute: Optional[int | float] = None,
-                 visuals: bool = True):
+                 visuals: bool = True,
+                 threshold: Optional[float] = None):
         """
         Initialize the MovieAnalyzer. Optionally show time charts of
         frame-by-frame changes. If scenecount_max is provided, no more
@@ -58,6 +68,8 @@ class MovieAnalyzer:
         :param video_path: Path to the video file (.mp4, .mov, etc.)
         :param scenecount_max: optional limit on the number of scenes
         :param visuals: whether or not to show progress bars and charts
+        :param threshold: content_val a frame change must reach near a 
+            scene change; None estimates it per video with estimate_threshold()
         """
         
         self.video_path = Path(video_path)
@@ -66,6 +78,7 @@ class MovieAnalyzer:
         self.scenecount_max = scenecount_max_absolute
         self.scenecount_max_per_minute = scenecount_max_per_minute
         self.visuals = visuals
+        self.threshold = threshold
         
         self.log = LoggingService()
         
@@ -75,6 +88,10 @@ class MovieAnalyzer:
         self.raw_scene_change_vals: pd.DataFrame = None
         self.smooth_scene_change_vals: pd.DataFrame = None
         self.scenes: pd.DataFrame = None
+        # Content_val threshold used for this video: the given
+        # threshold, or else the one suggested by estimate_threshold();
+        # set by analyze():
+        self.dynamic_threshold: float | None = None
         
     def analyze(self) -> pd.DataFrame:
         """
@@ -106,16 +123,16 @@ class MovieAnalyzer:
         duration_secs = int(self.video_stream.duration.get_seconds())
         duration_mins = int(np.ceil(duration_secs / 60))
         
-        # Create scene manager and stats manager. The scene manager
+        # Get scene manager and stats manager. The scene manager
         # coordinates the movie processing:
-        self.stats_manager = StatsManager()
-        self.scene_manager = SceneManager(self.stats_manager)
+        self.scene_manager, self.stats_manager = self._get_scene_manager()
         
         # Add content detector. It computes visual frame-by-frame 
         # differences, and produces the values as a score list: content_vals.
         # The high threshold ensures that the detector records
         # all content_val values, rather than filtering those
-        # below a threshold:
+        # below a threshold. The detector remembers the previous
+        # frame, so each video needs a fresh one:
         self.scene_manager.add_detector(ContentDetector(threshold=99999.0))
         
         # Find raw frame-content-change values:
@@ -124,9 +141,20 @@ class MovieAnalyzer:
         # Extract the raw content_val number from the stats manager:
         self.raw_scene_change_vals: pd.DataFrame = self._extract_content_values(self.stats_manager)
 
-        # Smooth these values, and find peaks and prominences
+        if self.threshold is not None:
+            self.dynamic_threshold = self.threshold
+        else:
+            # The content values are now cached, so scanning candidate
+            # thresholds costs no additional decoding of the video:
+            self.dynamic_threshold = self.estimate_threshold(
+                self.raw_scene_change_vals['content_val'])
+            self.log.info(f"Estimated scene change threshold: {self.dynamic_threshold}")
+
+        # Smooth these values, and find peaks and prominences. Peaks
+        # count only where the raw values reach the threshold:
         scene_detector = SceneChangeDetector(self.raw_scene_change_vals, 
-                                             self.video_path)
+                                             self.video_path,
+                                             min_content_val=self.dynamic_threshold)
         # Obtain a df with just scene change pointer, e.g. for just scenes:
         #  idx    content_val  frame_number  timecode   prominence  smoothed_val
         #  159     12.602648       160       5.333333    7.562601     12.153559
@@ -172,6 +200,63 @@ class MovieAnalyzer:
 
         return scenes
         
+    def _get_scene_manager(self) -> Tuple[SceneManager, StatsManager]:
+        '''
+        Return a scene manager and its stats manager, both emptied
+        of results from any earlier video, and with no detectors.
+        The pair is created once per thread, and reused for all
+        later videos analyzed in that thread.
+
+        :return: the scene manager and its stats manager
+        '''
+        try:
+            scene_manager = _thread_cache.scene_manager
+            stats_manager = _thread_cache.stats_manager
+        except AttributeError:
+            stats_manager = StatsManager()
+            scene_manager = SceneManager(stats_manager)
+            _thread_cache.scene_manager = scene_manager
+            _thread_cache.stats_manager = stats_manager
+            return scene_manager, stats_manager
+
+        scene_manager.clear()
+        scene_manager.clear_detectors()
+        # StatsManager has no public reset; like _extract_content_values(),
+        # reach into its frame metrics directly:
+        stats_manager._frame_metrics.clear()
+        return scene_manager, stats_manager
+
+    def estimate_threshold(self, 
+                           content_vals: pd.Series | np.ndarray,
+                           candidates: Optional[np.ndarray] = None
+                           ) -> float:
+        '''
+        Given the frame-by-frame content_val numbers of one video,
+        return the content_val threshold above which frames should
+        be considered scene changes. For each candidate threshold
+        tau, N(tau) is the number of frames whose content_val reaches
+        tau. The chosen threshold is the one at which N(tau) drops
+        most steeply: argmax(-dN/dtau).
+
+        All candidates are evaluated in one vectorized comparison
+        over the cached values, so no re-run of the detector is needed.
+
+        :param content_vals: raw content_val numbers, one per frame
+        :param candidates: thresholds to consider, defaults to 
+            THRESHOLD_CANDIDATES
+        :return: the estimated threshold
+        '''
+        if candidates is None:
+            candidates = self.THRESHOLD_CANDIDATES
+        diffs = np.asarray(content_vals, dtype=np.float32)
+        # The first frame has no predecessor, so its value is meaningless:
+        diffs = diffs[1:]
+        # Counts of frames at or above each candidate threshold:
+        counts = (diffs[:, None] >= candidates[None, :]).sum(axis=0)
+        # Steepest drop between neighboring candidates:
+        steepest = int(np.argmax(-np.diff(counts)))
+        return float(candidates[steepest])
+
     def _extract_content_values(self, stats_manager) -> pd.DataFrame:
         '''
         Extract content_val data from the stats manager. Returns
@@ -473,6 +558,10 @@ Examples:
     parser.add_argument('-c', '--scenecount',
                         default=None,
                         help='Limit on number of scenes; default: will find a reasonable number')
+    parser.add_argument('-t', '--threshold',
+                        type=float,
+                        default=None,
+                        help='Scene change content_val threshold; default: estimated per video')
     parser.add_argument('-o', '--output', 
                         type=str,
                         help='Save statistics to CSV file')
@@ -504,7 +593,10 @@ Examples:
 
     try:
         # Create analyzer
-        analyzer = MovieAnalyzer(args.video, scenecount_max_absolute=args.scenecount, visuals=visuals)
+        analyzer = MovieAnalyzer(args.video, 
+                                 scenecount_max_absolute=args.scenecount, 
+                                 visuals=visuals,
+                                 threshold=args.threshold)
         analyzer.analyze()
         
         # Print statistics
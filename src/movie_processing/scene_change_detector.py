@@ -40,7 +40,8 @@ class SceneChangeDetector:
             sigma: Optional[int] = 3, 
             min_prominence: Optional[float] = 3.0, 
             min_height: Optional[float] = 4.0,
-            change_magnitude_col: Optional[str] = 'content_val') -> pd.DataFrame:
+            change_magnitude_col: Optional[str] = 'content_val',
+            min_content_val: Optional[float] = None) -> pd.DataFrame:
         """
         Initializes the detector with key parameters.
         The time_series_spec will be loaded into a df from file if the 
@@ -64,11 +65,18 @@ class SceneChangeDetector:
                          (Used to ensure the detected peak is high enough, like 5.0)
         :data_col: column in .csv file or dataframe that holds the frame change
                          quantification data.
+        :param min_content_val: ContentDetector-style cut threshold. If given, 
+                         a peak only counts as a scene change if some raw 
+                         (unsmoothed) value within the smoothing window around
+                         it reaches this threshold, as with a hard cut. Gradual
+                         changes, such as camera motion, stay below it. 
+                         See MovieAnalyzer.estimate_threshold().
         """
         self.vid_path = vid_path
         self.sigma = sigma
         self.min_prominence = min_prominence
         self.min_height = min_height
+        self.min_content_val = min_content_val
         self.smoothed_data = None
         self.scene_change_indices = None
 
@@ -149,6 +157,10 @@ class SceneChangeDetector:
             prominence=self.min_prominence   # Must have enough prominence
         )
         
+        prominences = properties['prominences']
+        if self.min_content_val is not None and len(indices) > 0:
+            indices, prominences = self._filter_by_content_val(time_series, indices, prominences)
+        
         self.scene_change_indices = indices
         
         # Make a result df like:
@@ -160,7 +172,7 @@ class SceneChangeDetector:
         scene_data = self.time_series.iloc[indices].copy()
         scenes = pd.DataFrame({
             'frame_number': scene_data.index,
-            'prominence'  : properties['prominences'],
+            'prominence'  : prominences,
             'smoothed_content_val': self.smoothed_data[indices],
             'content_vals': scene_data.values
         })
@@ -185,6 +197,31 @@ class SceneChangeDetector:
         self.log.info(msg)
         return uniq_scenes
 
+    def _filter_by_content_val(self, 
+                               time_series: pd.Series,
+                               indices: np.ndarray,
+                               prominences: np.ndarray
+                               ) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Keep the peaks near which the raw time series reaches
+        self.min_content_val. The window around each peak is the 
+        reach of the Gaussian smoothing (3 sigma on each side). If 
+        no peak qualifies, the most prominent one is kept, so that 
+        every video yields at least one scene.
+
+        :param time_series: raw frame-by-frame change amounts
+        :param indices: positions of the smoothed peaks in time_series
+        :param prominences: the prominences of those peaks
+        :return: the positions and prominences of the remaining peaks
+        '''
+        raw = time_series.to_numpy()
+        reach = int(3 * self.sigma)
+        keep = np.array([raw[max(0, i - reach):i + reach + 1].max() >= self.min_content_val
+                         for i in indices])
+        if not keep.any():
+            keep[np.argmax(prominences)] = True
+        return indices[keep], prominences[keep]
+
     def deduplicate(self, scenes: pd.DataFrame, video_path: str
                     ) -> Tuple[pd.DataFrame, pd.Series]:
         '''
@@ -6,9 +6,12 @@
 # @Last Modified time: 2025-12-07 20:30:10
 
 import argparse
+import os
+import stat
 import subprocess
 import sys
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 from scenedetect import open_video, SceneManager
@@ -16,6 +19,12 @@ from scenedetect.detectors import ContentDetector
 from scenedetect.scene_manager import save_images
 import cv2
 
+try:
+    # Faster JSON parsing of ffprobe output, if available
+    import orjson
+except ImportError:
+    orjson = None
+
 from logging_service import LoggingService
 
 from common.utils import FileNamer
@@ -23,15 +32,14 @@ from movie_processing.movie_analyzer import MovieAnalyzer
 
 class MovieSceneExporter:
     # --- Class Constants ---
-    SUPPORTED_EXTENSIONS = {
+    SUPPORTED_EXTENSIONS = frozenset({
         '.mp4', '.mov', '.avi', '.mkv', '.webm', '.m4v', '.wmv', '.flv', '.ts'
-    }
+    })
 
-    # Threshold above which a difference between successive
-    # movie frames is large enough to make the frame a 
-    # scene representative:
-    DEFAULT_THRESHOLD = 27.0
     DEFAULT_IMAGE_FORMAT = 'jpeg'
+
+    # Number of threads writing encoded scene images to disk:
+    WRITER_THREADS = 4
     
     def __init__(self, 
                  root_dir, 
@@ -43,7 +51,10 @@ class MovieSceneExporter:
         self.out_dir = Path(out_dir) if out_dir else None
         self.max_size_mb = max_size_mb
         self.max_time_minutes = max_time_minutes
-        self.threshold = threshold if threshold is not None else self.DEFAULT_THRESHOLD
+        # Content_val a difference between successive movie frames
+        # must reach to make the frame a scene representative; None
+        # estimates it per video (see MovieAnalyzer.estimate_threshold()):
+        self.threshold = threshold
 
         # If no outdir is given for scene images, then
         # put them into the same directory as the root
@@ -57,10 +68,18 @@ class MovieSceneExporter:
         # more easily
         self.file_namer = FileNamer(self.out_dir)
 
+        # Scene images are encoded in memory, and written to disk
+        # in the background while the next video is analyzed:
+        self.write_pool = ThreadPoolExecutor(max_workers=self.WRITER_THREADS)
+        self.pending_writes = []
+
     def run_extraction(self):
-        videos = self.find_videos()
-        self.log.info(f"Found {len(videos)} videos in/under {self.root_dir}")
-        for vid in videos:
+        # Videos are processed as the directory walk finds
+        # them, rather than after the whole tree is listed:
+        self.log.info(f"Searching for videos in/under {self.root_dir}")
+        num_videos = 0
+        for vid in self.find_videos():
+            num_videos += 1
             #***********
             #if str(vid).find('fiddler') < 0:
             #    continue
@@ -72,6 +91,8 @@ class MovieSceneExporter:
             #    continue
             #***********
             self.process_video(vid)
+        self.flush_writes()
+        self.log.info(f"Found {num_videos} videos in/under {self.root_dir}")
 
     def process_video(self, 
                       video_path: str | Path, 
@@ -79,13 +100,19 @@ class MovieSceneExporter:
                       scenecount_max_per_minute: Optional[int | float] = None,
                       visuals: bool = False
                       ):
-
-            if self._should_skip(video_path):
-                return
+            '''
+            Find the scenes of one video, and write one image per
+            scene. The images are written in the background; call
+            flush_writes() to wait until all are on disk. 
+            run_extraction() does this after the last video.
+            '''
 
             # Ensure video_path is a pathlib.Path
             video_path = Path(video_path)
 
+            if self._should_skip(video_path):
+                return
+
             # Determine output folder
 
             dir_name = f"{video_path.stem}_scenes"
@@ -105,9 +132,14 @@ class MovieSceneExporter:
                     video_path, 
                     scenecount_max_absolute=scenecount_max,
                     scenecount_max_per_minute=scenecount_max_per_minute,
-                    visuals=visuals
+                    visuals=visuals,
+                    threshold=self.threshold
                     )
                 scenes = analyzer.analyze()
+                # Earlier videos' images must be on disk before
+                # mkfile_nm() checks for name conflicts. They have
+                # had the whole analysis time to finish:
+                self.flush_writes()
                 # Write the scene frames out to file:
                 self.log.info(f"Writing {len(scenes)} to disk...")
                 for i, scene in scenes.iterrows():
@@ -115,10 +147,26 @@ class MovieSceneExporter:
                     frame_number = scene['frame_number']
                     out_path = self.file_namer.mkfile_nm(
                         f"{scene_file_root}{frame_number}.jpg")
-                    cv2.imwrite(str(out_path), frame)
+                    success, jpeg_buf = cv2.imencode('.jpg', frame)
+                    if not success:
+                        raise IOError(f"Could not encode frame {frame_number} as JPEG")
+                    self.pending_writes.append(
+                        self.write_pool.submit(out_path.write_bytes, jpeg_buf.tobytes()))
             except Exception as e:
                 self.log.err(f"Failed to process {video_path.name}: {e}")
 
+    def flush_writes(self):
+        '''
+        Wait until all scene images handed to the background
+        writers are on disk. Write failures are logged.
+        '''
+        for write in self.pending_writes:
+            try:
+                write.result()
+            except Exception as e:
+                self.log.err(f"Failed to write scene image: {e}")
+        self.pending_writes = []
+
     def get_detailed_stats(self, file_path):
         """
         Uses ffprobe to extract detailed JSON metadata about the video file.
@@ -130,42 +178,54 @@ class MovieSceneExporter:
                 '-v', 'error',
                 '-select_streams', 'v:0',
                 '-show_entries', 'stream=width,height,codec_name,r_frame_rate',
-                '-show_entries', 'format=size,duration',
+                '-show_entries', 'format=duration',
                 '-of', 'json',
                 str(file_path)
             ]
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            # ffprobe's stderr is never read, so don't buffer it. The
+            # stdout bytes go straight to the JSON parser, which
+            # accepts bytes, so no decoding to str is needed:
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
             if result.returncode != 0:
                 return None
             
-            data = json.loads(result.stdout)
+            if orjson is not None:
+                data = orjson.loads(result.stdout)
+            else:
+                data = json.loads(result.stdout)
             
             # Extract Format info
             fmt = data.get('format', {})
             stream = data.get('streams', [{}])[0]
             
-            # Calculate size in MB
-            size_bytes = float(fmt.get('size', 0))
+            # Calculate size in MB. The file system knows the
+            # size, so ffprobe does not need to report it:
+            size_bytes = Path(file_path).stat().st_size
             size_mb = size_bytes / (1024 * 1024)
             
             # Calculate Duration
             duration_sec = float(fmt.get('duration', 0))
             
             # Calculate FPS (evaluates strings like "30000/1001")
+            # ffprobe reports integer rationals, so partition() and
+            # int() suffice; no intermediate list or floats needed:
             fps_str = stream.get('r_frame_rate', '0/0')
-            if '/' in fps_str:
-                num, den = map(float, fps_str.split('/'))
-                fps = num / den if den > 0 else 0
+            num, slash, den = fps_str.partition('/')
+            if slash:
+                den = int(den)
+                fps = int(num) / den if den > 0 else 0
             else:
                 fps = float(fps_str)
 
+            minutes, seconds = divmod(int(duration_sec), 60)
+
             return {
                 'filename': file_path.name,
                 'resolution': f"{stream.get('width')}x{stream.get('height')}",
                 'codec': stream.get('codec_name', 'unknown'),
                 'fps': round(fps, 2),
                 'duration_sec': duration_sec,
-                'duration_str': f"{int(duration_sec // 60)}:{int(duration_sec % 60):02d}",
+                'duration_str': f"{minutes}:{seconds:02d}",
                 'size_mb': round(size_mb, 2)
             }
         except Exception as e:
@@ -173,16 +233,17 @@ class MovieSceneExporter:
             return None
 
     def print_stats(self, target_files):
-        """Prints a formatted table of stats for the provided files."""
-        if not target_files:
-            self.log.info("No video files found to analyze.")
-            return
-
-        # Header
-        print(f"{'FILENAME':<40} | {'RES':<10} | {'CODEC':<8} | {'FPS':<6} | {'TIME':<7} | {'SIZE (MB)':<10}")
-        print("-" * 95)
-
+        """Prints a formatted table of stats for the provided files.
+        The target_files may be a list, or the generator returned
+        by find_videos()."""
+        header_printed = False
         for f in target_files:
+            if not header_printed:
+                # Header
+                print(f"{'FILENAME':<40} | {'RES':<10} | {'CODEC':<8} | {'FPS':<6} | {'TIME':<7} | {'SIZE (MB)':<10}")
+                print("-" * 95)
+                header_printed = True
+
             path = Path(f)
             if not path.exists():
                 self.log.warn(f"File not found: {path}")
@@ -196,19 +257,31 @@ class MovieSceneExporter:
             else:
                 print(f"{path.name:<40} | [Error reading metadata]")
 
+        if not header_printed:
+            self.log.info("No video files found to analyze.")
+
     def get_video_duration(self, file_path):
         """Lightweight duration check for filtering logic."""
         stats = self.get_detailed_stats(file_path)
         return stats['duration_sec'] if stats else None
 
     def find_videos(self):
-        """Recursively finds all supported videos in root_dir."""
+        """Recursively finds all supported videos in root_dir,
+        skipping hidden directories. This is a generator, so callers 
+        can start work on the first videos while the rest of the 
+        tree is still walked."""
         if not self.root_dir.exists():
             self.log.err(f"Root directory does not exist: {self.root_dir}")
-            return []
+            return
             
-        return [p for p in self.root_dir.rglob('*') 
-                if p.suffix.lower() in self.SUPPORTED_EXTENSIONS]
+        # Walk with os.walk() rather than rglob(), so that hidden
+        # directories, such as .Trash, can be pruned before they
+        # are descended into:
+        for dir_path, dir_names, file_names in os.walk(self.root_dir):
+            dir_names[:] = [d for d in dir_names if not d.startswith('.')]
+            for file_name in file_names:
+                if Path(file_name).suffix.lower() in self.SUPPORTED_EXTENSIONS:
+                    yield Path(dir_path) / file_name
 
     def _should_skip(self, file_path: str | Path) -> bool:
         '''
@@ -219,9 +292,26 @@ class MovieSceneExporter:
         :param file_path: full path to video
         :return: whether or not to skip
         '''
+        file_path = Path(file_path)
+
+        # Cheap checks first, so that files that cannot be
+        # videos are never opened. One stat() serves all of them:
+        try:
+            file_stat = file_path.stat()
+        except OSError as e:
+            self.log.warn(f"Skipping {file_path.name}: {e}")
+            return True
+        if not stat.S_ISREG(file_stat.st_mode):
+            self.log.warn(f"Skipping {file_path.name}: not a regular file")
+            return True
+        size_bytes = file_stat.st_size
+        if size_bytes == 0:
+            self.log.warn(f"Skipping {file_path.name}: file is empty")
+            return True
+
         # Size Check
         if self.max_size_mb:
-            size_mb = file_path.stat().st_size / (1024 * 1024)
+            size_mb = size_bytes / (1024 * 1024)
             if size_mb > self.max_size_mb:
                 self.log.warn(f"Skipping {file_path.name}: Size {size_mb:.2f}MB > limit {self.max_size_mb}MB")
                 return True
@@ -270,9 +360,9 @@ def parse_arguments():
     # Tuning
     parser.add_argument('--threshold', 
                         type=float, 
-                        default=MovieSceneExporter.DEFAULT_THRESHOLD, 
-                        help=(f"Scene change decision intensity threshold " 
-                              f"(default: {MovieSceneExporter.DEFAULT_THRESHOLD})"))
+                        default=None, 
+                        help=("Scene change decision intensity threshold " 
+                              "(default: estimated per video)"))
 
     # New: Show Stats Mode
     # nargs='*' means: "gather 0 or more arguments into a list"
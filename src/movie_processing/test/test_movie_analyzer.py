@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# @Author: Andreas Paepcke
+# @Date:   2025-12-08 10:21:37
+# @Last Modified by:   Andreas Paepcke
+# @Last Modified time: 2025-12-08 10:21:37
+
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+
+from movie_processing import movie_analyzer, scene_exporter
+from movie_processing.movie_analyzer import MovieAnalyzer
+from movie_processing.scene_change_detector import SceneChangeDetector
+from movie_processing.scene_exporter import MovieSceneExporter
+
+
+class MovieAnalyzerTester(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory(dir='/tmp', prefix='movie_analyzer_')
+        self.video = Path(self.tmp_dir.name) / 'movie.mp4'
+        self.video.write_bytes(b'not really a movie')
+
+        # Little change from frame to frame, except for
+        # hard cuts at frames 100 and 200:
+        content_vals = np.full(300, 5.0)
+        content_vals[[100, 200]] = 40.0
+        self.content_vals = pd.DataFrame({
+            'content_val': content_vals,
+            'frame_number': np.arange(300),
+            'timecode': np.arange(300) / 30.0
+        })
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+# --------------------- Tests ------------------
+
+    def test_estimated_threshold_reaches_detector(self):
+        scene_detector_cls = self._analyze(MovieAnalyzer(self.video, visuals=False))
+        _args, kwargs = scene_detector_cls.call_args
+        self.assertEqual(kwargs['min_content_val'], 40.0)
+
+    def test_given_threshold_reaches_detector(self):
+        analyzer = MovieAnalyzer(self.video, visuals=False, threshold=30.0)
+        with patch.object(analyzer, 'estimate_threshold') as estimate_threshold:
+            scene_detector_cls = self._analyze(analyzer)
+        estimate_threshold.assert_not_called()
+        _args, kwargs = scene_detector_cls.call_args
+        self.assertEqual(kwargs['min_content_val'], 30.0)
+
+    def test_exporter_passes_threshold_to_analyzer(self):
+        for threshold in (None, 30.0):
+            exporter = MovieSceneExporter(self.tmp_dir.name, threshold=threshold)
+            with patch.object(scene_exporter, 'MovieAnalyzer') as analyzer_cls, \
+                 patch.object(exporter, '_should_skip', return_value=False):
+                analyzer_cls.return_value.analyze.return_value = pd.DataFrame()
+                exporter.process_video(self.video)
+            _args, kwargs = analyzer_cls.call_args
+            self.assertEqual(kwargs['threshold'], threshold)
+
+    def test_peaks_filtered_by_content_val(self):
+        time_series = pd.Series(np.full(300, 5.0))
+        time_series[100] = 40.0
+        detector = SceneChangeDetector(time_series, str(self.video), min_content_val=30.0)
+        indices, prominences = detector._filter_by_content_val(
+            time_series, np.array([102, 250]), np.array([6.0, 8.0]))
+        # Only the peak within reach of the hard cut remains:
+        self.assertEqual(indices.tolist(), [102])
+        self.assertEqual(prominences.tolist(), [6.0])
+
+        # Without any qualifying peak, the most prominent one remains:
+        indices, _prominences = detector._filter_by_content_val(
+            time_series, np.array([200, 250]), np.array([6.0, 8.0]))
+        self.assertEqual(indices.tolist(), [250])
+
+# --------------------- Utilities ------------------
+
+    def _analyze(self, analyzer: MovieAnalyzer) -> MagicMock:
+        '''
+        Run analyzer.analyze() without decoding a video, and return
+        the mock that stood in for the SceneChangeDetector class.
+        '''
+        video_stream = MagicMock()
+        video_stream.duration.get_seconds.return_value = 10
+        with patch.object(movie_analyzer, 'open_video', return_value=video_stream), \
+             patch.object(analyzer, '_get_scene_manager', return_value=(MagicMock(), MagicMock())), \
+             patch.object(analyzer, '_extract_content_values', return_value=self.content_vals), \
+             patch.object(movie_analyzer, 'SceneChangeDetector') as scene_detector_cls:
+            analyzer.analyze()
+        return scene_detector_cls
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,6 +14,9 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    Filter, IsEmptyCondition, PayloadField
+)
 from common.utils import Utils
 from logging_service import LoggingService
 
@@ -74,42 +77,49 @@ def main():
             import traceback
             traceback.print_exc()
     else:
-        # Scroll through all photos and show ones with person_names
+        # Count and list only the photos with person_names
         print("\n=== Scanning all photos for person_names field ===\n")
 
+        # Let Qdrant find the photos with names, rather than paging
+        # the whole collection to the client:
+        has_names_filter = Filter(
+            must_not=[IsEmptyCondition(is_empty=PayloadField(key='person_names'))]
+        )
+
+        total_photos = client.count(
+            collection_name='photo_embeddings',
+            exact=True
+        ).count
+
         offset = None
         photos_with_names = []
-        total_photos = 0
 
         while True:
-            result = client.scroll(
+            points, next_offset = client.scroll(
                 collection_name='photo_embeddings',
-                limit=100,
+                scroll_filter=has_names_filter,
+                limit=4096,
                 offset=offset,
-                with_payload=True,
+                with_payload=['person_names', 'file_name', 'guid'],
                 with_vectors=False
             )
 
-            points, next_offset = result
-
             if not points:
                 break
 
             for point in points:
-                total_photos += 1
-                if 'person_names' in point.payload and point.payload['person_names']:
-                    photos_with_names.append({
-                        'guid': point.payload.get('guid', 'unknown'),
-                        'file_name': point.payload.get('file_name', 'unknown'),
-                        'person_names': point.payload['person_names']
-                    })
+                photos_with_names.append({
+                    'guid': point.payload.get('guid', 'unknown'),
+                    'file_name': point.payload.get('file_name', 'unknown'),
+                    'person_names': point.payload['person_names']
+                })
 
             if next_offset is None:
                 break
 
             offset = next_offset
 
-        print(f"Total photos scanned: {total_photos}")
+        print(f"Total photos in collection: {total_photos}")
         print(f"Photos with person_names: {len(photos_with_names)}\n")
 
         if photos_with_names:
@@ -19,18 +19,34 @@ Usage:
 
     # Remove orphaned entries but keep orphaned face entries
     ./cleanup_index.py --skip-faces
+
+    # Check existence against one walk of the photo tree
+    # instead of one stat() per index entry
+    ./cleanup_index.py --photo-root /raid/photos
 """
 
 import argparse
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 from qdrant_client import QdrantClient
 from qdrant_client.models import PointIdsList
 
 from common.config import QDRANT_PATH, QDRANT_HOST, QDRANT_PORT, COLLECTION_NAME
 
+# Number of points fetched per scroll request. The payloads
+# requested below are a few short strings, so large pages stay
+# well below Qdrant's message size limits while saving round-trips:
+SCROLL_BATCH_SIZE = 4096
+
+# Number of threads listing directories concurrently. Directory
+# reads mostly wait on the filesystem, especially on network
+# mounts, so more threads than cores is fine:
+STAT_WORKERS = 16
+
 
 def connect_to_qdrant() -> QdrantClient:
     """Connect to Qdrant (try server first, fall back to local)."""
@@ -50,67 +66,185 @@ def connect_to_qdrant() -> QdrantClient:
         return QdrantClient(path=QDRANT_PATH)
 
 
-def find_orphaned_entries(
+def scroll_pages(
     client: QdrantClient,
-    collection_name: str = COLLECTION_NAME
-) -> List[Tuple[int, str, str]]:
-    """Find all index entries where the photo file no longer exists.
+    collection_name: str,
+    with_payload: List[str]
+) -> Iterator[list]:
+    """Yield all points of a collection, one page at a time.
+
+    While the caller works on one page, the next page is already
+    being fetched in a background thread, so Qdrant round-trips
+    overlap with the caller's processing.
 
     Args:
         client: Qdrant client
-        collection_name: Name of the collection to scan
+        collection_name: Name of the collection to scroll
+        with_payload: Payload keys to fetch for each point
 
-    Returns:
-        List of tuples: (point_id, file_path, file_name)
+    Yields:
+        Lists of points
     """
-    print(f"\nScanning collection '{collection_name}' for orphaned entries...")
-
-    orphaned = []
-    total_scanned = 0
-
-    # Scroll through all points in the collection
-    offset = None
-    batch_size = 100
-
-    while True:
-        # Fetch a batch of points
-        points, next_offset = client.scroll(
+    def fetch(offset):
+        return client.scroll(
             collection_name=collection_name,
             offset=offset,
-            limit=batch_size,
-            with_payload=True,
+            limit=SCROLL_BATCH_SIZE,
+            with_payload=with_payload,
             with_vectors=False
         )
 
-        if not points:
-            break
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        pending = prefetcher.submit(fetch, None)
+        while True:
+            points, next_offset = pending.result()
+            if next_offset is not None:
+                pending = prefetcher.submit(fetch, next_offset)
+            if points:
+                yield points
+            if next_offset is None:
+                break
 
-        # Check each point
-        for point in points:
-            total_scanned += 1
 
-            file_path_str = point.payload.get('file_path')
-            file_name = point.payload.get('file_name', 'unknown')
+def list_files_under(root: str | Path) -> Set[str]:
+    """Collect the paths of all files below a directory.
+
+    Uses os.walk(), which reads each directory once via scandir,
+    so the cost is one readdir per directory rather than one
+    stat() per file.
+
+    Args:
+        root: Directory to walk
+
+    Returns:
+        Set of file path strings
+    """
+    known = set()
+    for dir_path, _dir_names, file_names in os.walk(root):
+        for file_name in file_names:
+            known.add(os.path.join(dir_path, file_name))
+    return known
+
+
+def list_dir_names(dir_path: str) -> Optional[Set[str]]:
+    """Return the names of all entries in one directory.
+
+    Args:
+        dir_path: Directory to list
+
+    Returns:
+        Set of entry names; empty if the directory does not exist.
+        None if it could not be read for another reason (permissions,
+        I/O or stale NFS errors), so its files' existence is unknown.
+    """
+    try:
+        with os.scandir(dir_path or '.') as entries:
+            return {entry.name for entry in entries}
+    except (FileNotFoundError, NotADirectoryError):
+        return set()
+    except OSError as e:
+        print(f"Warning: Could not list {dir_path} ({e}); checking its files one by one")
+        return None
+
+
+def file_is_missing(file_path: str) -> bool:
+    """Whether a file is known not to exist.
+
+    Unlike os.path.exists(), errors other than a missing file or
+    parent directory (e.g. permissions) do not count as missing.
+
+    Args:
+        file_path: Path to check
+
+    Returns:
+        True only if the file or one of its parents does not exist
+    """
+    try:
+        os.stat(file_path)
+    except (FileNotFoundError, NotADirectoryError):
+        return True
+    except OSError as e:
+        print(f"Warning: Could not check {file_path} ({e}); keeping it in the index")
+    return False
+
 
-            if not file_path_str:
-                print(f"Warning: Point {point.id} has no file_path in payload")
-                continue
+def find_orphaned_entries(
+    client: QdrantClient,
+    collection_name: str = COLLECTION_NAME,
+    photo_root: Optional[str] = None
+) -> List[Tuple[int, str, str]]:
+    """Find all index entries where the photo file no longer exists.
 
-            file_path = Path(file_path_str)
+    If photo_root is given, the tree below it is walked once, and
+    index entries are checked against the resulting set of paths.
+    Otherwise each entry's parent directory is listed, once per
+    directory, and the file name is looked up in that listing.
 
-            # Check if file exists
-            if not file_path.exists():
-                orphaned.append((point.id, file_path_str, file_name))
-                if len(orphaned) % 10 == 0:
-                    print(f"  Found {len(orphaned)} orphaned entries so far...")
+    Args:
+        client: Qdrant client
+        collection_name: Name of the collection to scan
+        photo_root: Optional directory under which all indexed photos live
+
+    Returns:
+        List of tuples: (point_id, file_path, file_name)
+    """
+    known_files = None
+    if photo_root:
+        photo_root = str(Path(photo_root))
+        root_prefix = os.path.join(photo_root, '')
+        print(f"\nListing files under {photo_root}...")
+        known_files = list_files_under(photo_root)
+        print(f"✓ Found {len(known_files)} files")
 
-        # Update offset for next batch
-        offset = next_offset
-        if offset is None:
-            break
+    print(f"\nScanning collection '{collection_name}' for orphaned entries...")
 
-        # Progress update
-        if total_scanned % 1000 == 0:
+    orphaned = []
+    total_scanned = 0
+    # Names in each parent directory listed so far; None for
+    # directories that could not be read:
+    dir_listings: Dict[str, Optional[Set[str]]] = {}
+
+    with ThreadPoolExecutor(max_workers=STAT_WORKERS) as stat_pool:
+        # Scroll through all points in the collection
+        for points in scroll_pages(client, collection_name, ['file_path', 'file_name']):
+            candidates = []
+            for point in points:
+                total_scanned += 1
+
+                file_path_str = point.payload.get('file_path')
+                file_name = point.payload.get('file_name', 'unknown')
+
+                if not file_path_str:
+                    print(f"Warning: Point {point.id} has no file_path in payload")
+                    continue
+                candidates.append((point.id, file_path_str, file_name))
+
+            # Check if files exist. Entries outside of photo_root are
+            # not covered by the listing, so look them up in their
+            # parent directories. Each new directory is read once,
+            # with several directories read at a time:
+            to_check = [os.path.split(fp) for _, fp, _ in candidates
+                        if known_files is None or not fp.startswith(root_prefix)]
+            new_dirs = list({parent for parent, _ in to_check} - dir_listings.keys())
+            dir_listings.update(zip(new_dirs, stat_pool.map(list_dir_names, new_dirs)))
+
+            for point_id, file_path_str, file_name in candidates:
+                if known_files is not None and file_path_str.startswith(root_prefix):
+                    exists = file_path_str in known_files
+                else:
+                    parent, base_name = os.path.split(file_path_str)
+                    dir_names = dir_listings[parent]
+                    if dir_names is None:
+                        exists = not file_is_missing(file_path_str)
+                    else:
+                        exists = base_name in dir_names
+
+                if not exists:
+                    orphaned.append((point_id, file_path_str, file_name))
+                    if len(orphaned) % 10 == 0:
+                        print(f"  Found {len(orphaned)} orphaned entries so far...")
+
+            # Progress update
             print(f"  Scanned {total_scanned} entries...")
 
     print(f"✓ Scanned {total_scanned} total entries")
@@ -135,6 +269,9 @@ def find_orphaned_faces(
     if not photo_guids:
         return []
 
+    # Membership is tested once per face point:
+    photo_guids = set(photo_guids)
+
     print(f"\nScanning 'photo_faces' collection for associated face entries...")
 
     faces_collection = 'photo_faces'
@@ -148,22 +285,9 @@ def find_orphaned_faces(
         return []
 
     # Scroll through all face points
-    offset = None
-    batch_size = 100
     total_scanned = 0
 
-    while True:
-        points, next_offset = client.scroll(
-            collection_name=faces_collection,
-            offset=offset,
-            limit=batch_size,
-            with_payload=True,
-            with_vectors=False
-        )
-
-        if not points:
-            break
-
+    for points in scroll_pages(client, faces_collection, ['photo_guid']):
         for point in points:
             total_scanned += 1
             photo_guid = point.payload.get('photo_guid')
@@ -171,12 +295,7 @@ def find_orphaned_faces(
             if photo_guid in photo_guids:
                 orphaned_faces.append(point.id)
 
-        offset = next_offset
-        if offset is None:
-            break
-
-        if total_scanned % 1000 == 0:
-            print(f"  Scanned {total_scanned} face entries...")
+        print(f"  Scanned {total_scanned} face entries...")
 
     print(f"✓ Scanned {total_scanned} face entries")
     print(f"✓ Found {len(orphaned_faces)} orphaned face entries")
@@ -210,29 +329,21 @@ def delete_orphaned_entries(
 
     print(f"\nDeleting {len(point_ids)} orphaned entries from '{collection_name}'...")
 
-    # Delete in batches to avoid overwhelming Qdrant
-    batch_size = 100
-    deleted = 0
-
-    for i in range(0, len(point_ids), batch_size):
-        batch = point_ids[i:i + batch_size]
-
-        try:
-            client.delete(
-                collection_name=collection_name,
-                points_selector=PointIdsList(points=batch)
-            )
-            deleted += len(batch)
-
-            if deleted % 500 == 0:
-                print(f"  Deleted {deleted}/{len(point_ids)} entries...")
-
-        except Exception as e:
-            print(f"Error deleting batch: {e}")
-            continue
+    # One request for all points; Qdrant batches internally. The
+    # call waits until the deletion is applied, so that failures
+    # are reported and the count below is true:
+    try:
+        client.delete(
+            collection_name=collection_name,
+            points_selector=PointIdsList(points=point_ids),
+            wait=True
+        )
+    except Exception as e:
+        print(f"Error deleting entries: {e}")
+        return 0
 
-    print(f"✓ Deleted {deleted} entries")
-    return deleted
+    print(f"✓ Deleted {len(point_ids)} entries")
+    return len(point_ids)
 
 
 def main():
@@ -254,6 +365,12 @@ def main():
         default=COLLECTION_NAME,
         help=f'Collection name to clean up (default: {COLLECTION_NAME})'
     )
+    parser.add_argument(
+        '--photo-root',
+        default=None,
+        help=('Directory under which all indexed photos live. If given, it is '
+              'listed once instead of checking each indexed file separately')
+    )
 
     args = parser.parse_args()
 
@@ -265,7 +382,7 @@ def main():
         sys.exit(1)
 
     # Find orphaned entries
-    orphaned = find_orphaned_entries(client, args.collection)
+    orphaned = find_orphaned_entries(client, args.collection, args.photo_root)
 
     if not orphaned:
         print("\n✓ No orphaned entries found. Index is clean!")
@@ -288,31 +405,16 @@ def main():
         # We need to get the GUIDs from the orphaned entries
         # Scroll again to get the full payloads
         photo_guids = []
-        offset = None
+        point_id_set = set(point_ids)
 
         print("\nRetrieving GUIDs of orphaned photos...")
-        while True:
-            points, next_offset = client.scroll(
-                collection_name=args.collection,
-                offset=offset,
-                limit=100,
-                with_payload=True,
-                with_vectors=False
-            )
-
-            if not points:
-                break
-
+        for points in scroll_pages(client, args.collection, ['guid']):
             for point in points:
-                if point.id in point_ids:
+                if point.id in point_id_set:
                     guid = point.payload.get('guid')
                     if guid:
                         photo_guids.append(guid)
 
-            offset = next_offset
-            if offset is None:
-                break
-
         print(f"✓ Retrieved {len(photo_guids)} GUIDs")
 
         # Find associated face entries
@@ -12,15 +12,39 @@ Usage:
     delete_photo.py /path/to/photo.jpg
     delete_photo.py --delete-file /path/to/photo.jpg
     delete_photo.py -d -y /path/to/photo1.jpg /path/to/photo2.jpg
+    delete_photo.py -d -y --max-concurrency 8 /path/to/photos/*.jpg
 """
 
 import argparse
+import os
+import queue
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from qdrant_client import QdrantClient
+from qdrant_client import models
+
+try:
+    # Optional io_uring backend for bulk unlinks (Linux only)
+    import liburing
+except ImportError:
+    liburing = None
 
 from common.utils import Utils
-from common.config import QDRANT_PATH, COLLECTION_NAME
+from common.config import (
+    QDRANT_PATH, QDRANT_HOST, QDRANT_PORT, QDRANT_GRPC_PORT, COLLECTION_NAME
+)
+
+# Default number of files unlinked concurrently
+DEFAULT_MAX_CONCURRENCY = 32
+
+# Number of unlinks submitted to io_uring per io_uring_enter() call
+URING_BATCH_SIZE = 128
+
+# Number of photos removed from the index per retrieve/delete round trip.
+# Disk deletion of one batch overlaps the index deletion of the next.
+INDEX_DELETE_BATCH = 256
 
 
 def confirm_deletion(photo_paths, delete_from_disk):
@@ -38,36 +62,63 @@ def confirm_deletion(photo_paths, delete_from_disk):
     return response == 'yes'
 
 
-def delete_photo_from_index(client, photo_path, collection_name):
-    """Delete a photo from the Qdrant index."""
+def delete_photos_from_index(client, photo_paths, collection_name):
+    """Delete photos from the Qdrant index.
+
+    All photos are looked up with one retrieve call, and the
+    ones found are removed with one delete call.
+
+    Returns:
+        Dict mapping each photo path to True if it was deleted
+        from the index, else False
+    """
+    # Map point IDs back to paths for per-photo reporting. Copies
+    # of one photo share a GUID, hence a point ID:
+    paths_by_id = {}
+    for photo_path in photo_paths:
+        try:
+            photo_guid = Utils.get_photo_guid(photo_path)
+        except FileNotFoundError:
+            print(f"Warning: Photo not found: {photo_path}", file=sys.stderr)
+            continue
+        except Exception as e:
+            print(f"Error reading {photo_path.name}: {e}", file=sys.stderr)
+            continue
+        paths_by_id.setdefault(Utils.guid_to_point_id(photo_guid), []).append(photo_path)
+
+    deleted = {photo_path: False for photo_path in photo_paths}
+    if not paths_by_id:
+        return deleted
+
     try:
-        # Generate GUID and point ID
-        photo_guid = Utils.get_photo_guid(photo_path)
-        point_id = Utils.guid_to_point_id(photo_guid)
-        
-        # Check if it exists
+        # Check which ones exist
         points = client.retrieve(
             collection_name=collection_name,
-            ids=[point_id],
+            ids=list(paths_by_id),
             with_payload=False,
             with_vectors=False
         )
-        
-        if not points:
-            print(f"Warning: {photo_path.name} not found in index", file=sys.stderr)
-            return False
-        
+        existing_ids = {point.id for point in points}
+
+        for point_id, paths in paths_by_id.items():
+            if point_id not in existing_ids:
+                for photo_path in paths:
+                    print(f"Warning: {photo_path.name} not found in index", file=sys.stderr)
+
         # Delete from index
-        client.delete(
-            collection_name=collection_name,
-            points_selector=[point_id]
-        )
-        
-        return True
-        
+        if existing_ids:
+            client.delete(
+                collection_name=collection_name,
+                points_selector=models.PointIdsList(points=list(existing_ids))
+            )
+        for point_id in existing_ids:
+            for photo_path in paths_by_id[point_id]:
+                deleted[photo_path] = True
+
     except Exception as e:
-        print(f"Error deleting {photo_path.name} from index: {e}", file=sys.stderr)
-        return False
+        print(f"Error deleting photos from index: {e}", file=sys.stderr)
+
+    return deleted
 
 
 def delete_photo_from_disk(photo_path):
@@ -80,6 +131,145 @@ def delete_photo_from_disk(photo_path):
         return False
 
 
+def delete_photos_from_disk(photo_paths, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """Delete photo files from disk, several at a time.
+
+    Uses batched io_uring unlinks when liburing is installed and the
+    kernel allows it. Otherwise unlinks are issued from several threads,
+    since they mostly wait on file system metadata updates.
+
+    Returns:
+        Dict mapping each photo path to True if it was deleted, else False
+    """
+    if not photo_paths:
+        return {}
+
+    ring = _init_uring()
+    if ring is not None:
+        try:
+            return _delete_photos_with_uring(ring, photo_paths)
+        finally:
+            liburing.io_uring_queue_exit(ring)
+
+    max_workers = max(1, min(max_concurrency, len(photo_paths)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(delete_photo_from_disk, photo_paths)
+        return dict(zip(photo_paths, results))
+
+
+def delete_photos(client, photo_paths, delete_file, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """Delete photos from the index and, if requested, from disk.
+
+    Index deletion runs in batches of INDEX_DELETE_BATCH. Each batch
+    whose index step is done is queued to a worker thread that unlinks
+    its files, so disk latency hides behind the next batch's hashing
+    and Qdrant round trips. Files are only unlinked after their GUIDs
+    were computed from their content.
+
+    Returns:
+        Tuple of dicts (index_results, disk_results), each mapping
+        photo path to True on success; disk_results is empty unless
+        delete_file is True
+    """
+    index_results = {}
+    disk_results = {}
+
+    disk_queue = None
+    if delete_file:
+        disk_queue = queue.Queue()
+
+        def drain_disk_queue():
+            for batch in iter(disk_queue.get, None):
+                disk_results.update(delete_photos_from_disk(batch, max_concurrency))
+
+        disk_worker = threading.Thread(target=drain_disk_queue)
+        disk_worker.start()
+
+    try:
+        for start in range(0, len(photo_paths), INDEX_DELETE_BATCH):
+            batch = photo_paths[start:start + INDEX_DELETE_BATCH]
+            index_results.update(delete_photos_from_index(client, batch, COLLECTION_NAME))
+            if disk_queue is not None:
+                disk_queue.put(batch)
+    finally:
+        if disk_queue is not None:
+            disk_queue.put(None)
+            disk_worker.join()
+
+    return index_results, disk_results
+
+
+def _init_uring():
+    """Set up an io_uring for bulk unlinks.
+
+    Returns:
+        The initialized ring, or None if liburing is not installed
+        or the kernel refuses io_uring (e.g. disabled by sysctl or seccomp)
+    """
+    if liburing is None:
+        return None
+    ring = liburing.Ring()
+    flags = liburing.IORING_SETUP_COOP_TASKRUN | liburing.IORING_SETUP_SINGLE_ISSUER
+    try:
+        liburing.io_uring_queue_init(URING_BATCH_SIZE, ring, flags)
+    except OSError:
+        return None
+    return ring
+
+
+def _delete_photos_with_uring(ring, photo_paths):
+    """Delete photo files from disk with batched IORING_OP_UNLINKAT.
+
+    Each batch of up to URING_BATCH_SIZE unlinks is submitted with a
+    single io_uring_enter() call, relative to an open descriptor of
+    each file's parent directory.
+
+    Returns:
+        Dict mapping each photo path to True if it was deleted, else False
+    """
+    results = {photo_path: False for photo_path in photo_paths}
+    dir_fds = {}
+    cqe = liburing.Cqe()
+    try:
+        for start in range(0, len(photo_paths), URING_BATCH_SIZE):
+            batch = photo_paths[start:start + URING_BATCH_SIZE]
+            queued = 0
+            for idx, photo_path in enumerate(batch):
+                parent = photo_path.parent
+                dir_fd = dir_fds.get(parent)
+                if dir_fd is None:
+                    try:
+                        dir_fd = os.open(parent, os.O_RDONLY | os.O_DIRECTORY)
+                    except OSError as e:
+                        print(f"Error deleting {photo_path.name} from disk: {e}", file=sys.stderr)
+                        continue
+                    dir_fds[parent] = dir_fd
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_unlink(sqe, photo_path.name, 0, dir_fd)
+                liburing.io_uring_sqe_set_data64(sqe, idx)
+                queued += 1
+            if not queued:
+                continue
+
+            liburing.io_uring_submit_and_wait(ring, queued)
+            liburing.io_uring_wait_cqe_nr(ring, cqe, queued)
+            ready = liburing.io_uring_cq_ready(ring)
+            for i in range(ready):
+                entry = cqe[i]
+                photo_path = batch[entry.user_data]
+                try:
+                    # Reading res raises OSError for a failed unlink
+                    entry.res
+                    results[photo_path] = True
+                except OSError as e:
+                    print(f"Error deleting {photo_path.name} from disk: {e}", file=sys.stderr)
+            liburing.io_uring_cq_advance(ring, ready)
+    finally:
+        for dir_fd in dir_fds.values():
+            os.close(dir_fd)
+    return results
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Delete photos from index and optionally from disk'
@@ -111,14 +301,34 @@ def main():
         action='store_true',
         help='Show what would be deleted without actually deleting'
     )
+    parser.add_argument(
+        '--host',
+        type=str,
+        default=None,
+        help='Qdrant server host; without it, local storage at --qdrant-path is used'
+    )
+    parser.add_argument(
+        '--grpc',
+        action='store_true',
+        help=f'Talk to the Qdrant server over gRPC (port {QDRANT_GRPC_PORT}); '
+             f'implies --host {QDRANT_HOST} if no host is given'
+    )
+    parser.add_argument(
+        '--max-concurrency',
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help=f'Maximum number of files deleted from disk concurrently (default: {DEFAULT_MAX_CONCURRENCY})'
+    )
     
     args = parser.parse_args()
     
-    # Validate all photo paths
+    # Missing photos are reported when they are hashed for the index
+    # and when they are unlinked, so there is no up-front stat() of
+    # every path. A dry run touches no files, so it checks existence:
     photo_paths = []
     for path_str in args.photo_paths:
         path = Path(path_str)
-        if not path.exists():
+        if args.dry_run and not path.exists():
             print(f"Warning: Photo not found: {path}", file=sys.stderr)
             continue
         photo_paths.append(path)
@@ -137,32 +347,46 @@ def main():
         print("\nDRY RUN - No files will be deleted")
         print("-" * 70)
     
-    # Connect to Qdrant
-    client = QdrantClient(path=args.qdrant_path)
+    # Connect to Qdrant: a server if asked for, else local storage
+    host = args.host or (QDRANT_HOST if args.grpc else None)
+    if host:
+        client = QdrantClient(
+            host=host,
+            port=QDRANT_PORT,
+            grpc_port=QDRANT_GRPC_PORT,
+            prefer_grpc=args.grpc
+        )
+    else:
+        client = QdrantClient(path=args.qdrant_path)
     
     # Delete photos
     deleted_from_index = 0
     deleted_from_disk = 0
-    
+
+    if not args.dry_run:
+        index_results, disk_results = delete_photos(
+            client, photo_paths, args.delete_file, args.max_concurrency
+        )
+
     for photo_path in photo_paths:
         print(f"Processing: {photo_path.name}")
         
-        # Delete from index
+        # Report index deletion
         if args.dry_run:
             print(f"  Would delete from index")
         else:
-            if delete_photo_from_index(client, photo_path, COLLECTION_NAME):
+            if index_results[photo_path]:
                 print(f"  ✓ Deleted from index")
                 deleted_from_index += 1
             else:
                 print(f"  ✗ Failed to delete from index")
         
-        # Delete from disk if requested
+        # Report disk deletion if requested
         if args.delete_file:
             if args.dry_run:
                 print(f"  Would delete from disk")
             else:
-                if delete_photo_from_disk(photo_path):
+                if disk_results.get(photo_path, False):
                     print(f"  ✓ Deleted from disk")
                     deleted_from_disk += 1
                 else:
@@ -6,6 +6,10 @@ Generate and print description for a photo using Llama Vision model.
 Usage:
     get_description.py /path/to/photo.jpg
     get_description.py --prompt "Describe the mood" /path/to/photo.jpg
+    cat photo_paths.txt | get_description.py --server
+
+For more than one photo, use --server: the model is loaded once and
+reused for every path read from stdin, instead of once per invocation.
 """
 
 import argparse
@@ -15,6 +19,70 @@ import json
 
 from photo_index.embedding_generator import EmbeddingGenerator
 from common.config import MODEL_PATH, DEVICE, IMG_DESC_PROMPT
+from common.utils import Utils
+
+
+def describe_photo(photo_path, prompt=None, generator=None):
+    """Generate the description of one photo.
+
+    Args:
+        photo_path: Path to the photo file
+        prompt: Custom prompt (default: use config prompt)
+        generator: Already loaded EmbeddingGenerator to reuse; if None,
+            the model is loaded for this call
+
+    Returns:
+        The description text as produced by the model
+    """
+    if generator is None:
+        print(f"Loading model...", file=sys.stderr)
+        generator = EmbeddingGenerator(MODEL_PATH, DEVICE)
+
+    print(f"Generating description for {Path(photo_path).name}...", file=sys.stderr)
+    return generator.generate_description(photo_path, prompt=prompt)
+
+
+def print_description(photo_path, description, raw=False):
+    """Print a description, pretty-printing it if it is JSON."""
+    if raw:
+        # Just print the raw output
+        print(description)
+        return
+
+    print(f"\nDescription for: {photo_path.name}")
+    print("=" * 60)
+    # Try to parse and pretty-print JSON
+    try:
+        desc_dict = Utils.json_loads(description)
+        print(Utils.json_dumps_pretty(desc_dict))
+    except json.JSONDecodeError:
+        # Not JSON, just print as text
+        print(description)
+
+
+def serve(prompt=None, raw=False):
+    """Describe each photo path read from stdin, one per line.
+
+    The model is loaded once and kept warm for all photos.
+    """
+    print(f"Loading model...", file=sys.stderr)
+    generator = EmbeddingGenerator(MODEL_PATH, DEVICE)
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        photo_path = Path(line)
+        if not photo_path.exists():
+            print(f"Error: Photo not found: {photo_path}", file=sys.stderr)
+            continue
+        try:
+            description = describe_photo(photo_path, prompt, generator)
+        except Exception as e:
+            print(f"Error describing {photo_path.name}: {e}", file=sys.stderr)
+            continue
+        print_description(photo_path, description, raw)
+        sys.stdout.flush()
 
 
 def main():
@@ -24,6 +92,7 @@ def main():
     parser.add_argument(
         'photo_path',
         type=str,
+        nargs='?',
         help='Path to the photo file'
     )
     parser.add_argument(
@@ -37,8 +106,20 @@ def main():
         action='store_true',
         help='Print raw output without formatting'
     )
+    parser.add_argument(
+        '--server',
+        action='store_true',
+        help='Read photo paths from stdin, one per line, reusing the loaded model'
+    )
     
     args = parser.parse_args()
+
+    if args.server:
+        serve(prompt=args.prompt, raw=args.raw)
+        return
+
+    if args.photo_path is None:
+        parser.error('photo_path is required unless --server is given')
     
     # Validate photo path
     photo_path = Path(args.photo_path)
@@ -46,32 +127,8 @@ def main():
         print(f"Error: Photo not found: {photo_path}", file=sys.stderr)
         sys.exit(1)
     
-    # Initialize generator
-    print(f"Loading model...", file=sys.stderr)
-    generator = EmbeddingGenerator(MODEL_PATH, DEVICE)
-    
-    # Generate description
-    print(f"Generating description for {photo_path.name}...", file=sys.stderr)
-    description = generator.generate_description(
-        photo_path, 
-        prompt=args.prompt
-    )
-    
-    if args.raw:
-        # Just print the raw output
-        print(description)
-    else:
-        # Try to parse and pretty-print JSON
-        try:
-            desc_dict = json.loads(description)
-            print(f"\nDescription for: {photo_path.name}")
-            print("=" * 60)
-            print(json.dumps(desc_dict, indent=2))
-        except json.JSONDecodeError:
-            # Not JSON, just print as text
-            print(f"\nDescription for: {photo_path.name}")
-            print("=" * 60)
-            print(description)
+    description = describe_photo(photo_path, prompt=args.prompt)
+    print_description(photo_path, description, args.raw)
 
 
 if __name__ == "__main__":
@@ -12,8 +12,8 @@ Usage:
 import argparse
 import sys
 from pathlib import Path
-import json
 
+from common.utils import Utils
 from photo_index.exif_utils import ExifExtractor
 from photo_index.geocoding import Geocoder
 
@@ -116,7 +116,7 @@ def main():
     
     # Extract EXIF
     extractor = ExifExtractor()
-    exif_data = extractor.extract_exif(photo_path)
+    exif_data = extractor.extract_exif(photo_path, include_raw=args.raw)
     
     # Geocode if requested
     location = None
@@ -138,7 +138,7 @@ def main():
             'exif': exif_data,
             'location': location
         }
-        print(json.dumps(output, indent=2))
+        print(Utils.json_dumps_pretty(output))
     else:
         # Format for reading
         print(f"\nEXIF data for: {photo_path.name}")
@@ -11,27 +11,43 @@ Show the indexed payload for a photo from Qdrant.
 Usage:
     show_index.py /path/to/photo.jpg
     show_index.py --json /path/to/photo.jpg
+    find /raid/photos -name '*.jpg' | show_index.py --paths-from-stdin
 """
 
 import argparse
 import sys
 from pathlib import Path
-import json
 from qdrant_client import QdrantClient
 
 from common.utils import Utils
-from common.config import QDRANT_PATH, QDRANT_HOST, QDRANT_PORT, COLLECTION_NAME
+from common.config import (
+    QDRANT_PATH, QDRANT_HOST, QDRANT_PORT, QDRANT_GRPC_PORT, COLLECTION_NAME
+)
 
 
 def format_payload(payload, indent=0):
-    """Format payload for readable display."""
+    """Format payload for readable display.
+    
+    Nested dicts are walked with an explicit stack, so every line
+    lands in one list that is joined once.
+    """
     output = []
-    indent_str = "  " * indent
+    stack = [(iter(payload.items()), indent)]
     
-    for key, value in payload.items():
+    while stack:
+        items, level = stack[-1]
+        item = next(items, None)
+        if item is None:
+            stack.pop()
+            continue
+        key, value = item
+        indent_str = "  " * level
+        
         if isinstance(value, dict):
             output.append(f"{indent_str}{key}:")
-            output.append(format_payload(value, indent + 1))
+            if not value:
+                output.append("")
+            stack.append((iter(value.items()), level + 1))
         elif isinstance(value, list):
             output.append(f"{indent_str}{key}: {value}")
         elif value is None:
@@ -45,6 +61,75 @@ def format_payload(payload, indent=0):
     return "\n".join(output)
 
 
+def connect(qdrant_path, host=QDRANT_HOST, prefer_grpc=False):
+    """Connect to Qdrant (try server first, fall back to local).
+    
+    This matches the logic in PhotoIndexer. With prefer_grpc, the
+    server is talked to over gRPC instead of REST.
+    """
+    if host and QDRANT_PORT:
+        try:
+            client = QdrantClient(
+                host=host, 
+                port=QDRANT_PORT,
+                grpc_port=QDRANT_GRPC_PORT,
+                prefer_grpc=prefer_grpc
+            )
+            # Test connection
+            client.get_collections()
+            return client
+        except Exception:
+            # Fall back to local storage
+            pass
+    return QdrantClient(path=qdrant_path)
+
+
+def show_payloads(client, photo_paths, as_json=False):
+    """Print the indexed payloads of photos, fetched in one request.
+    
+    Returns:
+        Number of photos that were not found in the index
+    """
+    point_ids = {}
+    for photo_path in photo_paths:
+        photo_guid = Utils.get_photo_guid(photo_path)
+        point_ids[photo_path] = (photo_guid, Utils.guid_to_point_id(photo_guid))
+
+    # Retrieve all points at once
+    points = client.retrieve(
+        collection_name=COLLECTION_NAME,
+        ids=list({point_id for _, point_id in point_ids.values()}),
+        with_payload=True,
+        with_vectors=False
+    )
+    payload_by_id = {point.id: point.payload for point in points}
+
+    num_missing = 0
+    for photo_path, (photo_guid, point_id) in point_ids.items():
+        payload = payload_by_id.get(point_id)
+        if payload is None:
+            print(f"Error: Photo not found in index: {photo_path}", file=sys.stderr)
+            print(f"  GUID: {photo_guid}", file=sys.stderr)
+            print(f"  Point ID: {point_id}", file=sys.stderr)
+            num_missing += 1
+            continue
+        
+        if as_json:
+            # Output as JSON
+            print(Utils.json_dumps_pretty(payload))
+        else:
+            # Format for reading
+            print(f"\nIndexed data for: {photo_path.name}")
+            print("=" * 70)
+            print(f"GUID: {photo_guid}")
+            print(f"Point ID: {point_id}")
+            print("-" * 70)
+            print(format_payload(payload))
+            print("=" * 70)
+
+    return num_missing
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Show indexed payload for a photo'
@@ -52,6 +137,7 @@ def main():
     parser.add_argument(
         'photo_path',
         type=str,
+        nargs='?',
         help='Path to the photo file'
     )
     parser.add_argument(
@@ -65,66 +151,54 @@ def main():
         default=QDRANT_PATH,
         help=f'Qdrant storage path (default: {QDRANT_PATH})'
     )
+    parser.add_argument(
+        '--host',
+        type=str,
+        default=QDRANT_HOST,
+        help=f'Qdrant server host, tried before local storage (default: {QDRANT_HOST})'
+    )
+    parser.add_argument(
+        '--grpc',
+        action='store_true',
+        help=f'Talk to the Qdrant server over gRPC (port {QDRANT_GRPC_PORT})'
+    )
+    parser.add_argument(
+        '--paths-from-stdin',
+        action='store_true',
+        help='Read photo paths from stdin, one per line, and look them all up with one client'
+    )
     
     args = parser.parse_args()
+
+    if args.paths_from_stdin:
+        raw_paths = [line.strip() for line in sys.stdin if line.strip()]
+    elif args.photo_path is not None:
+        raw_paths = [args.photo_path]
+    else:
+        parser.error('photo_path is required unless --paths-from-stdin is given')
     
-    # Validate photo path
-    photo_path = Path(args.photo_path)
-    if not photo_path.exists():
-        print(f"Error: Photo not found: {photo_path}", file=sys.stderr)
+    # Validate photo paths
+    photo_paths = []
+    for raw_path in raw_paths:
+        photo_path = Path(raw_path)
+        if not photo_path.exists():
+            print(f"Error: Photo not found: {photo_path}", file=sys.stderr)
+            continue
+        photo_paths.append(photo_path)
+    if not photo_paths:
         sys.exit(1)
     
-    # Generate GUID for the photo
-    photo_guid = Utils.get_photo_guid(photo_path)
-    point_id = Utils.guid_to_point_id(photo_guid)
-
-    # Connect to Qdrant (try server first, fall back to local)
-    # This matches the logic in PhotoIndexer
-    if QDRANT_HOST and QDRANT_PORT:
-        try:
-            client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
-            # Test connection
-            client.get_collections()
-        except Exception:
-            # Fall back to local storage
-            client = QdrantClient(path=args.qdrant_path)
-    else:
-        client = QdrantClient(path=args.qdrant_path)
+    client = connect(args.qdrant_path, host=args.host, prefer_grpc=args.grpc)
     
-    # Retrieve the point
     try:
-        points = client.retrieve(
-            collection_name=COLLECTION_NAME,
-            ids=[point_id],
-            with_payload=True,
-            with_vectors=False
-        )
-        
-        if not points:
-            print(f"Error: Photo not found in index: {photo_path}", file=sys.stderr)
-            print(f"  GUID: {photo_guid}", file=sys.stderr)
-            print(f"  Point ID: {point_id}", file=sys.stderr)
-            sys.exit(1)
-        
-        payload = points[0].payload
-        
-        if args.json:
-            # Output as JSON
-            print(json.dumps(payload, indent=2))
-        else:
-            # Format for reading
-            print(f"\nIndexed data for: {photo_path.name}")
-            print("=" * 70)
-            print(f"GUID: {photo_guid}")
-            print(f"Point ID: {point_id}")
-            print("-" * 70)
-            print(format_payload(payload))
-            print("=" * 70)
-            
+        num_missing = show_payloads(client, photo_paths, args.json)
     except Exception as e:
         print(f"Error retrieving from Qdrant: {e}", file=sys.stderr)
         sys.exit(1)
 
+    if num_missing or len(photo_paths) < len(raw_paths):
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     main()
@@ -5,56 +5,201 @@
 # @Last Modified time: 2025-11-27 11:05:31
 """Image embedding generation using Llama 3.2-Vision model."""
 
+import importlib.util
+import logging
+import math
 import os
 
 # Set HuggingFace cache directory before importing transformers
 os.environ['HF_HOME'] = '/data/huggingface'
 
 import torch
-from transformers import MllamaForConditionalGeneration, AutoProcessor, GenerationConfig
+from transformers import (
+    MllamaForConditionalGeneration, MllamaVisionModel, AutoProcessor,
+    GenerationConfig, BitsAndBytesConfig
+)
 from PIL import Image
 import pillow_heif
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 import numpy as np
 
+try:
+    # Optional FP8 weight-only quantization of the vision encoder
+    from torchao.quantization import quantize_, Float8WeightOnlyConfig
+except ImportError:
+    quantize_ = None
+
 from logging_service import LoggingService
 
-from common.config import IMG_DESC_PROMPT, OUTPUT_TOKENS
+from common.config import (
+    IMG_DESC_PROMPT, OUTPUT_TOKENS, BATCH_SIZE, 
+    COMPILE_VISION_MODEL, QUANTIZATION
+)
 
 # Register HEIF opener
 pillow_heif.register_heif_opener()
 
+# Tracebacks only; they are formatted only when DEBUG is enabled
+logger = logging.getLogger(__name__)
+
 class EmbeddingGenerator:
     """Generate image embeddings using Llama 3.2-Vision model."""
     
-    def __init__(self, model_path: str, device: str = "cuda"):
+    def __init__(self, 
+                 model_path: str, 
+                 device: str = "cuda",
+                 quantization: str = QUANTIZATION,
+                 mode: str = "both"):
         """Initialize the embedding generator.
         
         Args:
             model_name: HuggingFace model name
             device: Device to run on ("cuda" or "cpu")
+            quantization: None for bf16 weights, 'int8' for bitsandbytes
+                8-bit weights, or 'fp8' for torchao FP8 weight-only
+                quantization of the vision encoder
+            mode: "both" loads the full model; "embed" loads only the
+                vision encoder, leaving out the language model and its
+                memory, in which case generate_description() is
+                unavailable
         """
+        if quantization not in (None, 'int8', 'fp8'):
+            raise ValueError(f"Unknown quantization '{quantization}'; use None, 'int8', or 'fp8'")
+        if mode not in ('embed', 'both'):
+            raise ValueError(f"Unknown mode '{mode}'; use 'embed' or 'both'")
+        
         self.device = device
+        self.use_cuda = str(device).startswith('cuda')
         self.model_path = model_path
+        self.mode = mode
 
         self.log = LoggingService()
         
         self.log.info(f"Loading model {model_path} on {device}...")
         
         # Load model and processor
-        self.model = MllamaForConditionalGeneration.from_pretrained(
-            model_path,
+        quantization_config = None
+        if quantization == 'int8':
+            quantization_config = BitsAndBytesConfig(load_in_8bit=True)
+        # Fused attention kernels: FlashAttention-2 when installed
+        # on CUDA, else PyTorch's scaled_dot_product_attention:
+        attn_implementation = "sdpa"
+        if self.use_cuda and importlib.util.find_spec('flash_attn') is not None:
+            attn_implementation = "flash_attention_2"
+        # Embedding only needs the vision encoder, which loads
+        # by itself from the full checkpoint:
+        model_cls = MllamaVisionModel if mode == 'embed' else MllamaForConditionalGeneration
+        load_kwargs = dict(
             torch_dtype=torch.bfloat16,
             device_map=device,
+            quantization_config=quantization_config,
             local_files_only=True
         )
+        try:
+            model = model_cls.from_pretrained(
+                model_path,
+                attn_implementation=attn_implementation,
+                **load_kwargs
+            )
+        except ValueError as e:
+            if attn_implementation == "sdpa":
+                raise
+            # Model or GPU does not support FlashAttention-2
+            self.log.warn(f"FlashAttention-2 unavailable ({e}); using sdpa")
+            model = model_cls.from_pretrained(
+                model_path,
+                attn_implementation="sdpa",
+                **load_kwargs
+            )
+        model.eval()
+        if mode == 'embed':
+            self.model = None
+            self.vision_model = model
+        else:
+            self.model = model
+            self.vision_model = model.vision_model
+        if quantization == 'fp8':
+            if quantize_ is None:
+                raise ImportError("FP8 quantization requires the torchao package")
+            # Only the vision encoder feeds embeddings:
+            quantize_(self.vision_model, Float8WeightOnlyConfig())
         
         self.processor = AutoProcessor.from_pretrained(
             model_path, 
             local_files_only=True
             )
-        self.model.eval()
+
+        # Smallest image side the processor can make use of: images are
+        # resized onto a canvas of tiles whose short side spans at most
+        # isqrt(max_image_tiles) tiles. JPEGs are decoded no smaller:
+        image_processor = self.processor.image_processor
+        try:
+            self._decode_min_side = (image_processor.size['height'] 
+                                     * math.isqrt(image_processor.max_image_tiles))
+        except (AttributeError, KeyError, TypeError):
+            self._decode_min_side = None
+
+        # Chat-template renderings of description prompts, by prompt
+        self._chat_prompts = {}
+
+        # Embedding width, filled in by get_embedding_dim()
+        self._embedding_dim = None
+
+        # Side stream for uploading the next embedding batch while
+        # the current one computes
+        self.copy_stream = torch.cuda.Stream(device=device) if self.use_cuda else None
+
+        # Greedy decoding settings for descriptions, built once. Where
+        # the model supports a static KV cache, use it on CUDA: then
+        # generate() compiles the per-token decode step and replays it
+        # as a CUDA graph instead of launching each kernel from Python.
+        # Mllama's cross-attention layers have their own cache shapes,
+        # so models without static cache support keep the dynamic one.
+        self.gen_config = None
+        if self.model is not None:
+            supports_static_cache = (getattr(self.model, '_supports_static_cache', False)
+                                     or getattr(self.model, '_can_compile_fullgraph', False))
+            self.gen_config = GenerationConfig(
+                max_new_tokens=OUTPUT_TOKENS,
+                do_sample=False,
+                temperature=None,
+                top_p=None,
+                pad_token_id=self.processor.tokenizer.pad_token_id,
+                eos_token_id=self.processor.tokenizer.eos_token_id,
+                cache_implementation="static" if self.use_cuda and supports_static_cache else None
+            )
+
+        # Vision encoder forward used for embeddings. On CUDA, compile
+        # it: "reduce-overhead" captures CUDA graphs per input shape,
+        # which removes most per-call Python and kernel launch overhead.
+        # Each image is its own sample, padded to the full tile grid,
+        # so pixel_values is [batch, 1, max_tiles, 3, H, W] and shapes
+        # only vary with the batch size on dim 0:
+        self.vision_fwd = self.vision_model
+        # bitsandbytes int8 layers do not compile, so int8 stays eager.
+        if (COMPILE_VISION_MODEL 
+            and self.use_cuda 
+            and quantization != 'int8'):
+            self.vision_fwd = torch.compile(
+                self.vision_model,
+                mode="reduce-overhead",
+                fullgraph=False,
+                dynamic=False
+            )
+            # Pay compilation and CUDA graph capture now rather than
+            # on the first real photo, for single images and for full
+            # batches. Capture happens on the second call for a given
+            # shape:
+            try:
+                warmup_img = Image.new('RGB', (100, 100), color='red')
+                for batch_size in sorted({1, BATCH_SIZE}):
+                    for _ in range(2):
+                        self._embed_images([warmup_img] * batch_size)
+            except Exception as e:
+                self.log.warn(f"Compiled vision model failed ({e}); running it uncompiled")
+                self.vision_fwd = self.vision_model
         
         self.log.info("Model loaded successfully")
     
@@ -70,48 +215,174 @@ class EmbeddingGenerator:
         """
         try:
             # Load and preprocess image
-            image = Image.open(image_path).convert('RGB')
-            
-            # Process only the image (no text)
-            inputs = self.processor.image_processor(
-                images=image,
-                return_tensors="pt"
-            )
-            
-            # Move inputs to device
-            pixel_values = inputs['pixel_values'].to(self.device)
-            aspect_ratio_ids = inputs['aspect_ratio_ids'].to(self.device)
-            aspect_ratio_mask = inputs['aspect_ratio_mask'].to(self.device)
-            
-            # Generate embedding using vision model directly
-            with torch.no_grad():
-                # Call vision model with all required inputs
-                vision_outputs = self.model.vision_model(
-                    pixel_values=pixel_values,
-                    aspect_ratio_ids=aspect_ratio_ids,
-                    aspect_ratio_mask=aspect_ratio_mask
-                )
-                
-                # Get hidden states: shape is [batch, num_images, tiles, seq_len, hidden_dim]
-                hidden_states = vision_outputs[0]
-                
-                # Average over all dimensions except the last (hidden_dim)
-                # This collapses: batch, images, tiles, and sequence length
-                embedding = hidden_states.mean(dim=(0, 1, 2, 3))  # Results in shape [hidden_dim]
-                
-                # Convert to numpy
-                embedding_np = embedding.cpu().float().numpy()
-            
-            return embedding_np
+            image = self._open_rgb(image_path)
+            return self._embed_images([image])[0]
             
         except Exception as e:
             self.log.err(f"Error generating embedding for {image_path}: {e}")
             raise
 
+    def _to_device(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Copy a host tensor to the model's device.
+        
+        On CUDA the tensor is staged in pinned memory, whose blocks
+        PyTorch's host allocator caches and reuses, so the copy runs
+        at full PCIe bandwidth and does not block the host thread.
+        Later kernels on the same stream are ordered after it.
+        """
+        if self.use_cuda:
+            return tensor.pin_memory().to(self.device, non_blocking=True)
+        return tensor.to(self.device)
+
+    def _to_host(self, tensor: torch.Tensor) -> np.ndarray:
+        """Copy a device tensor into a numpy array.
+        
+        On CUDA the copy lands in a pinned buffer and the host waits
+        only on the current stream, not on the whole device.
+        """
+        if not self.use_cuda:
+            return tensor.cpu().numpy()
+        out = torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=True)
+        out.copy_(tensor, non_blocking=True)
+        torch.cuda.current_stream(tensor.device).synchronize()
+        return out.numpy()
+
+    def _open_rgb(self, image_path: Path) -> Image.Image:
+        """Open an image and decode it as RGB.
+        
+        JPEGs are decoded at 1/2, 1/4, or 1/8 scale (libjpeg's DCT
+        scaling) when both sides still stay at or above the resolution
+        the image processor resizes to. That skips most of the decode
+        and resize work for large camera photos. Other formats decode
+        at full size.
+        
+        Args:
+            image_path: Path to the image file
             
-        except Exception as e:
-            self.log.err(f"Error generating embedding for {image_path}: {e}")
-            raise        
+        Returns:
+            RGB image
+        """
+        image = Image.open(image_path)
+        if self._decode_min_side:
+            # No-op for formats other than JPEG
+            image.draft('RGB', (self._decode_min_side, self._decode_min_side))
+        return image.convert('RGB')
+
+    def _embed_images(self, images: List[Image.Image]) -> np.ndarray:
+        """Run the vision model once over a batch of images.
+        
+        Args:
+            images: RGB images to embed
+            
+        Returns:
+            Numpy array of shape [len(images), hidden_dim]
+        """
+        return self._embed_inputs(self._preprocess(images))
+
+    def _preprocess(self, images: List[Image.Image]) -> Dict[str, torch.Tensor]:
+        """Turn images into vision model inputs on the host.
+        
+        This is pure CPU work, so it can run on a background thread
+        while the GPU embeds the previous batch. On CUDA the tensors
+        come back pinned, ready for asynchronous copies.
+        
+        Args:
+            images: RGB images to preprocess
+            
+        Returns:
+            Dict with pixel_values, aspect_ratio_ids, and aspect_ratio_mask
+        """
+        # Process only the images (no text). Mllama reads a flat list
+        # as one sample holding several images, so wrap each image to
+        # make it its own sample, i.e. its own row of the batch:
+        inputs = self.processor.image_processor(
+            images=[[image] for image in images],
+            return_tensors="pt"
+        )
+        # The vision model casts pixels to its bf16 weight dtype anyway;
+        # casting before the copy halves the bytes sent over PCIe:
+        inputs = {
+            'pixel_values': inputs['pixel_values'].to(torch.bfloat16),
+            'aspect_ratio_ids': inputs['aspect_ratio_ids'],
+            'aspect_ratio_mask': inputs['aspect_ratio_mask'],
+        }
+        if self.use_cuda:
+            inputs = {k: v.pin_memory() for k, v in inputs.items()}
+        return inputs
+
+    def _upload(self, 
+                inputs: Dict[str, torch.Tensor]
+                ) -> Tuple[Dict[str, torch.Tensor], torch.cuda.Event]:
+        """Start copying pinned host inputs to the GPU on the copy stream.
+        
+        Args:
+            inputs: Pinned host tensors as returned by _preprocess()
+            
+        Returns:
+            The device tensors, and an event that fires when the
+            copies are done; pass both to _embed_inputs()
+        """
+        with torch.cuda.stream(self.copy_stream):
+            on_device = {k: v.to(self.device, non_blocking=True) for k, v in inputs.items()}
+            ready = torch.cuda.Event()
+            ready.record(self.copy_stream)
+        return on_device, ready
+
+    def _embed_inputs(self, 
+                      inputs: Dict[str, torch.Tensor],
+                      ready: Optional[torch.cuda.Event] = None) -> np.ndarray:
+        """Run the vision model over preprocessed inputs and pool.
+        
+        Args:
+            inputs: Host tensors as returned by _preprocess(), or
+                device tensors as returned by _upload()
+            ready: The upload event if inputs came from _upload()
+            
+        Returns:
+            Numpy array of shape [batch, hidden_dim]
+        """
+        if ready is not None:
+            # Uploaded on the copy stream: order the forward pass after
+            # the copies, and tell the caching allocator the tensors
+            # are in use on this stream as well
+            stream = torch.cuda.current_stream()
+            stream.wait_event(ready)
+            for tensor in inputs.values():
+                tensor.record_stream(stream)
+            pixel_values = inputs['pixel_values']
+            aspect_ratio_ids = inputs['aspect_ratio_ids']
+            aspect_ratio_mask = inputs['aspect_ratio_mask']
+        else:
+            # Move inputs to device
+            pixel_values = self._to_device(inputs['pixel_values'])
+            aspect_ratio_ids = self._to_device(inputs['aspect_ratio_ids'])
+            aspect_ratio_mask = self._to_device(inputs['aspect_ratio_mask'])
+        
+        # Generate embeddings using vision model directly
+        with torch.inference_mode():
+            # Call vision model with all required inputs. Explicitly
+            # ask for the last hidden state only, so a config that
+            # enables per-layer outputs cannot make us keep every
+            # layer's activations just to pool one of them:
+            vision_outputs = self.vision_fwd(
+                pixel_values=pixel_values,
+                aspect_ratio_ids=aspect_ratio_ids,
+                aspect_ratio_mask=aspect_ratio_mask,
+                output_hidden_states=False,
+                output_attentions=False
+            )
+            
+            # Get hidden states: shape is [batch, num_images, tiles, seq_len, hidden_dim]
+            hidden_states = vision_outputs[0]
+            
+            # Average over all dimensions except batch and hidden_dim
+            # This collapses: images, tiles, and sequence length. The
+            # reduction accumulates and emits float32 in one kernel,
+            # so no separate cast is needed:
+            embeddings = hidden_states.mean(dim=(1, 2, 3), dtype=torch.float32)  # [batch, hidden_dim]
+            
+            # Convert to numpy in one transfer
+            return self._to_host(embeddings)
 
     def generate_description(self, image_path: Path, prompt: str = None) -> str:
         """Generate a text description of the image contents.
@@ -123,30 +394,19 @@ class EmbeddingGenerator:
         Returns:
             Text description of the image
         """
+        if self.model is None:
+            raise RuntimeError("Descriptions need the language model; "
+                               "this EmbeddingGenerator was created with mode='embed'")
         try:
             # Load image
-            image = Image.open(image_path).convert('RGB')
+            image = self._open_rgb(image_path)
             
             # Default prompt optimized for object detection and description
             if prompt is None:
                 prompt = IMG_DESC_PROMPT
             
-            # Format as a chat message (Llama format)
-            messages = [
-                {
-                    "role": "user", 
-                    "content": [
-                        {"type": "image"},
-                        {"type": "text", "text": prompt}
-                    ]
-                }
-            ]
-            
-            # Apply chat template
-            input_text = self.processor.apply_chat_template(
-                messages, 
-                add_generation_prompt=True
-            )
+            # Chat-formatted prompt, rendered once per distinct prompt
+            input_text = self._chat_prompt(prompt)
             
             # Process with the properly formatted text
             inputs = self.processor(
@@ -157,21 +417,13 @@ class EmbeddingGenerator:
             )
             
             # Move to device
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            inputs = {k: self._to_device(v) for k, v in inputs.items()}
             
             # Generate description
-            gen_config = GenerationConfig(
-                max_new_tokens=OUTPUT_TOKENS,
-                do_sample=False,
-                temperature=None,
-                top_p=None,
-                pad_token_id=self.processor.tokenizer.pad_token_id,
-                eos_token_id=self.processor.tokenizer.eos_token_id
-            )            
-            with torch.no_grad():
+            with torch.inference_mode():
                 output_ids = self.model.generate(
                     **inputs,
-                    generation_config=gen_config
+                    generation_config=self.gen_config
                 )
             
             # Decode - get only the new tokens
@@ -184,54 +436,151 @@ class EmbeddingGenerator:
             
         except Exception as e:
             self.log.err(f"Error generating description for {image_path}: {e}")
-            import traceback
-            self.log.err(traceback.format_exc())
+            logger.debug(f"Traceback for {image_path}", exc_info=True)
             return ""
 
-    def generate_embeddings_batch(self, image_paths: List[Path]) -> List[np.ndarray]:
+    def _chat_prompt(self, prompt: str) -> str:
+        """Return prompt wrapped in the Llama chat template.
+        
+        The template render is cached per prompt, since descriptions
+        are generated with the same prompt for every photo.
+        """
+        input_text = self._chat_prompts.get(prompt)
+        if input_text is None:
+            # Format as a chat message (Llama format)
+            messages = [
+                {
+                    "role": "user", 
+                    "content": [
+                        {"type": "image"},
+                        {"type": "text", "text": prompt}
+                    ]
+                }
+            ]
+            
+            # Apply chat template
+            input_text = self.processor.apply_chat_template(
+                messages, 
+                add_generation_prompt=True
+            )
+            self._chat_prompts[prompt] = input_text
+        return input_text
+
+    def generate_embeddings_batch(self, 
+                                  image_paths: List[Path],
+                                  batch_size: int = BATCH_SIZE
+                                  ) -> List[Optional[np.ndarray]]:
         """Generate embeddings for a batch of images.
         
+        Images are handled batch_size at a time: each chunk is embedded
+        with one vision model forward pass while the next chunk is
+        decoded on a thread pool, preprocessed, and uploaded on a side
+        CUDA stream, hiding decode, resizing, and copies behind the GPU.
+        
         Args:
             image_paths: List of paths to image files
+            batch_size: Number of images per forward pass
             
         Returns:
-            List of numpy arrays containing embeddings
+            List of numpy arrays containing embeddings; None for
+            images that could not be embedded
         """
-        embeddings = []
+        embeddings = [None] * len(image_paths)
         
-        for image_path in image_paths:
+        def load(image_path):
             try:
-                embedding = self.generate_embedding(image_path)
-                embeddings.append(embedding)
+                return self._open_rgb(image_path)
             except Exception as e:
                 self.log.err(f"Skipping {image_path} due to error: {e}")
-                # Return zero vector on error
-                embeddings.append(None)
+                return None
+        
+        def prepare(paths):
+            """Decode a chunk in parallel, then preprocess it as one batch.
+            
+            On CUDA the inputs are also uploaded on the copy stream.
+            
+            Returns (images, indices of decoded images, model inputs 
+            or None, upload event or None)
+            """
+            images = list(decode_pool.map(load, paths))
+            loaded = [i for i, image in enumerate(images) if image is not None]
+            inputs = None
+            ready = None
+            if loaded:
+                try:
+                    inputs = self._preprocess([images[i] for i in loaded])
+                    if self.use_cuda:
+                        inputs, ready = self._upload(inputs)
+                except Exception as e:
+                    self.log.warn(f"Batch preprocessing failed ({e})")
+                    inputs = None
+            return images, loaded, inputs, ready
+        
+        # Enough decoders to fill the next chunk while the GPU
+        # works on the current one:
+        max_workers = max(1, min(os.cpu_count() or 1, batch_size))
+        with ThreadPoolExecutor(max_workers=max_workers) as decode_pool, \
+             ThreadPoolExecutor(max_workers=1) as prepare_pool:
+            # Prepare the first chunk; later chunks are prefetched below
+            pending = prepare_pool.submit(prepare, image_paths[:batch_size])
+            for start in range(0, len(image_paths), batch_size):
+                images, loaded, inputs, ready = pending.result()
+                # Start decoding and preprocessing the next chunk
+                # before running the model on this one
+                next_paths = image_paths[start + batch_size:start + 2 * batch_size]
+                if next_paths:
+                    pending = prepare_pool.submit(prepare, next_paths)
+                
+                if not loaded:
+                    continue
+                try:
+                    if inputs is None:
+                        raise ValueError("no preprocessed inputs")
+                    batch_embeddings = self._embed_inputs(inputs, ready)
+                    if len(batch_embeddings) != len(loaded):
+                        raise ValueError(f"{len(batch_embeddings)} embeddings "
+                                         f"for {len(loaded)} images")
+                    for i, embedding in zip(loaded, batch_embeddings):
+                        embeddings[start + i] = embedding
+                except Exception as e:
+                    # Fall back to one image at a time so that a single
+                    # bad image only loses its own embedding
+                    self.log.warn(f"Batch embedding failed ({e}); retrying images individually")
+                    for i in loaded:
+                        try:
+                            embeddings[start + i] = self._embed_images([images[i]])[0]
+                        except Exception as e:
+                            self.log.err(f"Skipping {image_paths[start + i]} due to error: {e}")
         
         return embeddings
     
     def get_embedding_dim(self) -> int:
         """Get the dimension of embeddings produced by this model.
         
+        The dimension is determined once and cached.
+        
         Returns:
             Embedding dimension
         """
-        # Try to auto-detect by generating a dummy embedding
+        if self._embedding_dim is not None:
+            return self._embedding_dim
+        
+        # Embeddings are pooled vision encoder outputs, whose width
+        # the vision config records (final layer plus the intermediate
+        # layers Mllama concatenates):
+        vision_output_dim = getattr(self.vision_model.config, 'vision_output_dim', None)
+        if vision_output_dim:
+            self._embedding_dim = vision_output_dim
+            return self._embedding_dim
+        
+        # Otherwise auto-detect by embedding a dummy image
         try:
-            import tempfile
-            from PIL import Image
-            
             # Create a small test image
             test_img = Image.new('RGB', (100, 100), color='red')
-            with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as f:
-                test_img.save(f.name)
-                test_path = Path(f.name)
-            
-            # Generate embedding to get actual dimension
-            embedding = self.generate_embedding(test_path)
-            test_path.unlink()  # Delete temp file
+            embedding = self._embed_images([test_img])[0]
             
-            return embedding.shape[0]
+            self._embedding_dim = embedding.shape[0]
+            return self._embedding_dim
         except Exception as e:
             self.log.warn(f"Warning: Could not auto-detect embedding dimension: {e}")
             self.log.info("Using default value of 7680")
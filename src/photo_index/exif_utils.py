@@ -10,7 +10,11 @@ from PIL import Image
 from PIL.ExifTags import TAGS, GPSTAGS
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import os
+import sys
 import pillow_heif
 import subprocess
 import json
@@ -18,64 +22,164 @@ import json
 # Register HEIF opener
 pillow_heif.register_heif_opener()
 
+# Files opened with pillow_heif directly when reading EXIF
+HEIF_EXTENSIONS = frozenset({'.heic', '.heif'})
+
+# Pointers from the main IFD to the Exif and GPS sub-IFDs
+EXIF_IFD_POINTER = 0x8769
+GPS_IFD_POINTER = 0x8825
+
+# The EXIF tags extract_exif() reports, by tag ID
+TARGET_TAG_IDS = {
+    271: 'Make',
+    272: 'Model',
+    36867: 'DateTimeOriginal',
+    306: 'DateTime',
+    40962: 'ExifImageWidth',
+    40963: 'ExifImageHeight',
+    274: 'Orientation',
+    34855: 'ISOSpeedRatings',
+    37386: 'FocalLength',
+    33437: 'FNumber',
+    33434: 'ExposureTime',
+}
+
 class ExifExtractor:
     """Extract and process EXIF data from images."""
     
     def __init__(self, geocoding_user_agent: str = "photo_indexer"):
         pass
     
-    def extract_exif(self, image_path: Path) -> Dict:
+    def extract_exif(self, image_path: Path, include_raw: bool = False) -> Dict:
         """Extract EXIF data from an image file.
         
         Args:
             image_path: Path to the image file
+            include_raw: If True, also serialize every EXIF tag
+                into the result's 'raw_exif' entry
             
         Returns:
             Dictionary containing EXIF data and parsed GPS coordinates
         """
         try:
-            with Image.open(image_path) as img:
-                exif_data = img._getexif()
-                
-                if not exif_data:
-                    return self._empty_exif()
-                
-                # Parse EXIF tags
-                parsed_exif = {}
-                gps_info = {}
-                
-                for tag_id, value in exif_data.items():
-                    tag_name = TAGS.get(tag_id, tag_id)
-                    
-                    if tag_name == "GPSInfo":
-                        gps_info = self._parse_gps_info(value)
-                    else:
-                        # Convert to serializable format
-                        parsed_exif[tag_name] = self._serialize_value(value)
-                
-                # Extract key metadata
-                result = {
-                    'camera_make': parsed_exif.get('Make'),
-                    'camera_model': parsed_exif.get('Model'),
-                    'date_taken': self._parse_datetime(parsed_exif.get('DateTimeOriginal') or parsed_exif.get('DateTime')),
-                    'width': parsed_exif.get('ExifImageWidth') or img.width,
-                    'height': parsed_exif.get('ExifImageHeight') or img.height,
-                    'orientation': parsed_exif.get('Orientation'),
-                    'iso': parsed_exif.get('ISOSpeedRatings'),
-                    'focal_length': parsed_exif.get('FocalLength'),
-                    'aperture': parsed_exif.get('FNumber'),
-                    'exposure_time': parsed_exif.get('ExposureTime'),
-                    'gps': gps_info,
-                    'keywords': self.read_keywords(image_path),
-                    'raw_exif': parsed_exif
-                }
-                
-                return result
+            exif, (width, height) = self._read_exif(image_path)
+            
+            if not exif:
+                return self._empty_exif()
+            
+            # Tags such as DateTimeOriginal and ISOSpeedRatings live
+            # in the Exif sub-IFD; merge it over the main IFD
+            exif_data = dict(exif)
+            exif_data.update(exif.get_ifd(EXIF_IFD_POINTER))
+            
+            # Look up only the tags we report
+            parsed_exif = {
+                name: self._serialize_value(exif_data[tag_id])
+                for tag_id, name in TARGET_TAG_IDS.items()
+                if tag_id in exif_data
+            }
+            
+            gps_info = {}
+            gps_data = exif.get_ifd(GPS_IFD_POINTER)
+            if gps_data:
+                gps_info = self._parse_gps_info(gps_data)
+            
+            # Extract key metadata
+            result = {
+                'camera_make': parsed_exif.get('Make'),
+                'camera_model': parsed_exif.get('Model'),
+                'date_taken': self._parse_datetime(parsed_exif.get('DateTimeOriginal') or parsed_exif.get('DateTime')),
+                'width': parsed_exif.get('ExifImageWidth') or width,
+                'height': parsed_exif.get('ExifImageHeight') or height,
+                'orientation': parsed_exif.get('Orientation'),
+                'iso': parsed_exif.get('ISOSpeedRatings'),
+                'focal_length': parsed_exif.get('FocalLength'),
+                'aperture': parsed_exif.get('FNumber'),
+                'exposure_time': parsed_exif.get('ExposureTime'),
+                'gps': gps_info,
+                'keywords': self.read_keywords(image_path),
+                'raw_exif': self._serialize_all(exif_data) if include_raw else {}
+            }
+            
+            return result
                 
         except Exception as e:
             print(f"Error extracting EXIF from {image_path}: {e}")
             return self._empty_exif()
     
+    def _read_exif(self, image_path: Path) -> Tuple[Image.Exif, Tuple[int, int]]:
+        """Read an image's EXIF block and pixel size without decoding pixels.
+        
+        HEIF files are opened with pillow_heif directly, which parses
+        the container but leaves the image tiles undecoded. Other
+        formats go through Image.open(), which for JPEG reads only
+        the header segments.
+        
+        Args:
+            image_path: Path to the image file
+            
+        Returns:
+            Tuple of (EXIF mapping, (width, height))
+        """
+        exif = Image.Exif()
+        if Path(image_path).suffix.lower() in HEIF_EXTENSIONS:
+            heif_file = pillow_heif.open_heif(image_path, convert_hdr_to_8bit=False)
+            exif_bytes = heif_file.info.get('exif')
+            if exif_bytes:
+                exif.load(exif_bytes)
+            return exif, heif_file.size
+        
+        with Image.open(image_path) as img:
+            exif_bytes = img.info.get('exif')
+            if exif_bytes:
+                exif.load(exif_bytes)
+            else:
+                # Formats such as TIFF keep EXIF in the main IFD
+                # rather than in an 'exif' blob
+                exif = img.getexif()
+            return exif, img.size
+    
+    def _serialize_all(self, exif_data: Dict) -> Dict:
+        """Serialize every EXIF tag by name, except the GPS and Exif IFD pointers."""
+        return {
+            TAGS.get(tag_id, tag_id): self._serialize_value(value)
+            for tag_id, value in exif_data.items()
+            if tag_id not in (GPS_IFD_POINTER, EXIF_IFD_POINTER)
+        }
+    
+    def extract_exif_batch(self,
+                           image_paths: List[Path],
+                           max_workers: Optional[int] = None,
+                           chunksize: int = 32) -> List[Dict]:
+        """Extract EXIF data from many image files in parallel.
+        
+        Uses worker processes, since EXIF parsing holds the GIL. On a
+        free-threaded interpreter threads scale as well and skip the
+        pickling, so a thread pool is used there instead.
+        
+        Args:
+            image_paths: Paths to the image files
+            max_workers: Number of workers; defaults to the CPU count
+            chunksize: Paths handed to a worker process at a time
+            
+        Returns:
+            One extract_exif() result per path, in input order
+        """
+        if not image_paths:
+            return []
+        max_workers = max_workers or os.cpu_count() or 1
+        
+        gil_enabled = getattr(sys, '_is_gil_enabled', lambda: True)()
+        if not gil_enabled:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                return list(pool.map(self.extract_exif, image_paths))
+        
+        # Spawn rather than fork: callers such as the indexer hold a
+        # CUDA context, which must not be forked
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            return list(pool.map(self.extract_exif, image_paths, chunksize=chunksize))
+    
     def _empty_exif(self) -> Dict:
         """Return empty EXIF structure."""
         return {
@@ -187,8 +291,15 @@ class ExifExtractor:
             return None
         
         try:
-            # EXIF datetime format: "YYYY:MM:DD HH:MM:SS"
-            dt = datetime.strptime(datetime_str, "%Y:%m:%d %H:%M:%S")
+            # EXIF datetime format: "YYYY:MM:DD HH:MM:SS". The format
+            # is fixed, so slice it rather than run strptime()'s
+            # format interpreter; datetime() still rejects bad values.
+            # Separators sit at offsets 4, 7, 10, 13 and 16.
+            if len(datetime_str) != 19 or datetime_str[4:17:3] != ':: ::':
+                raise ValueError(datetime_str)
+            dt = datetime(int(datetime_str[0:4]), int(datetime_str[5:7]),
+                          int(datetime_str[8:10]), int(datetime_str[11:13]),
+                          int(datetime_str[14:16]), int(datetime_str[17:19]))
             return dt.isoformat()
         except Exception:
             return datetime_str  # Return as-is if parsing fails
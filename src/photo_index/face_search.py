@@ -6,13 +6,47 @@
 # @Last Modified time: 2025-11-29 12:31:03
 """Face search functionality for finding similar faces."""
 
+import hashlib
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from operator import itemgetter
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from qdrant_client.models import (
+    Filter, FieldCondition, MatchValue, MatchAny, QueryRequest,
+    SearchParams, QuantizationSearchParams, OrderBy, Direction,
+    IsEmptyCondition, PayloadField
+)
 
 from logging_service import LoggingService
-from photo_index.face_detector import FaceDetector
+from photo_index.face_detector import FaceDetector, get_face_detector
+
+
+# On a scalar-quantized faces collection, fetch twice the requested
+# candidates by int8 score, then rescore them with the original vectors;
+# ignored by collections without quantization
+FACE_SEARCH_PARAMS = SearchParams(
+    quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
+)
+
+# Payload fields each kind of face result reads; Qdrant sends only these
+FACE_RESULT_FIELDS = ['photo_guid', 'photo_path', 'photo_filename',
+                      'face_index', 'bbox', 'confidence', 'person_name']
+_face_result_values = itemgetter(*FACE_RESULT_FIELDS)
+FACE_LISTING_FIELDS = ['face_index', 'bbox', 'confidence', 'person_name']
+FACE_NAME_FIELDS = ['face_index', 'person_name']
+
+# Entries in each of FaceSearcher's search caches
+SEARCH_CACHE_SIZE = 128
+
+# Upper bound on distinct person names returned by the facet query
+PERSON_NAME_FACET_LIMIT = 100000
+# Without facets, the name scan stops after this many consecutive pages
+# without a new name, or after this many tagged faces
+PERSON_NAME_SCAN_PATIENCE = 20
+PERSON_NAME_MAX_SCAN = 1000000
 
 
 class FaceSearcher:
@@ -21,19 +55,46 @@ class FaceSearcher:
     def __init__(
         self,
         qdrant_client: QdrantClient,
-        faces_collection_name: str = 'photo_faces'
+        faces_collection_name: str = 'photo_faces',
+        photos_collection_name: str = 'photo_embeddings'
     ):
         """Initialize face searcher.
 
         Args:
             qdrant_client: Qdrant client instance
             faces_collection_name: Name of the faces collection
+            photos_collection_name: Name of the photos collection
         """
         self.qdrant_client = qdrant_client
         self.faces_collection_name = faces_collection_name
-        self.face_detector = FaceDetector()
+        self.photos_collection_name = photos_collection_name
         self.log = LoggingService()
 
+        # Independent requests may overlap only against a Qdrant server;
+        # the embedded local mode is not safe for concurrent access
+        init_options = getattr(qdrant_client, 'init_options', None) or {}
+        self._concurrent_requests = (
+            bool(init_options)
+            and init_options.get('path') is None
+            and init_options.get('location') != ':memory:'
+        )
+        self._executor = ThreadPoolExecutor(max_workers=4) if self._concurrent_requests else None
+
+        # LRU caches for repeated searches: detected faces by
+        # (path, mtime), and results by (embedding digest, limit,
+        # threshold). Tagging clears the results, which show names.
+        self._detect_cache: OrderedDict = OrderedDict()
+        self._query_cache: OrderedDict = OrderedDict()
+
+        # Distinct tagged person names, loaded on first use and kept
+        # current by tag_face(); None when not loaded
+        self._person_names: Optional[set] = None
+
+    @cached_property
+    def face_detector(self) -> FaceDetector:
+        """The shared face detector, loaded only once a search needs it."""
+        return get_face_detector()
+
     def search_by_photo(
         self,
         photo_path: Path,
@@ -52,39 +113,126 @@ class FaceSearcher:
         Returns:
             List of face results with photo info and similarity scores
         """
-        # Detect faces in the query photo
-        detected_faces = self.face_detector.detect_faces(photo_path)
+        return self.search_by_photos(
+            [photo_path],
+            [face_index],
+            limit=limit,
+            score_threshold=score_threshold
+        )[0]
+
+    def search_by_photos(
+        self,
+        photo_paths: List[Path],
+        face_indices: List[int],
+        limit: int = 20,
+        score_threshold: float = 0.5
+    ) -> List[List[Dict]]:
+        """Search for similar faces for several query faces at once.
 
-        if not detected_faces or face_index >= len(detected_faces):
-            return []
+        Faces are detected once per distinct photo, and all searches
+        go to Qdrant in a single batched request.
 
-        # Get the embedding for the specified face
-        query_embedding = detected_faces[face_index].embedding
+        Args:
+            photo_paths: Paths to photos containing the faces to search for
+            face_indices: For each photo path, the index of the face
+                in that photo (0=largest, 1=second largest, etc.)
+            limit: Maximum number of results per query
+            score_threshold: Minimum similarity score (0-1)
 
-        # Search in Qdrant
-        results = self.qdrant_client.search(
+        Returns:
+            One list of face results per (photo_path, face_index) pair,
+            empty where the photo has no such face
+        """
+        if len(photo_paths) != len(face_indices):
+            raise ValueError("photo_paths and face_indices must have the same length")
+
+        # Detect faces in each distinct query photo, reusing earlier
+        # detections of unchanged files
+        unique_paths = list(dict.fromkeys(photo_paths))
+        detect_keys = {path: self._detect_cache_key(path) for path in unique_paths}
+        faces_by_path = {}
+        to_detect = []
+        for path in unique_paths:
+            cached = self._cache_get(self._detect_cache, detect_keys[path])
+            if cached is None:
+                to_detect.append(path)
+            else:
+                faces_by_path[path] = cached
+        if to_detect:
+            for path, faces in zip(to_detect, self.face_detector.detect_faces_batch(to_detect)):
+                faces_by_path[path] = faces
+                if detect_keys[path] is not None:
+                    self._cache_put(self._detect_cache, detect_keys[path], faces)
+
+        # One query per (photo, face) pair that exists and has no
+        # cached result
+        face_results = [[] for _ in photo_paths]
+        requests = []
+        query_slots = []
+        query_keys = []
+        for slot, (photo_path, face_index) in enumerate(zip(photo_paths, face_indices)):
+            detected_faces = faces_by_path[photo_path]
+            if face_index >= len(detected_faces):
+                continue
+            embedding = detected_faces[face_index].embedding
+            query_key = (hashlib.blake2b(embedding.tobytes()).digest(), limit, score_threshold)
+            cached = self._cache_get(self._query_cache, query_key)
+            if cached is not None:
+                face_results[slot] = list(cached)
+                continue
+            requests.append(QueryRequest(
+                query=embedding.tolist(),
+                limit=limit,
+                score_threshold=score_threshold,
+                params=FACE_SEARCH_PARAMS,
+                with_payload=FACE_RESULT_FIELDS
+            ))
+            query_slots.append(slot)
+            query_keys.append(query_key)
+
+        if not requests:
+            return face_results
+
+        # Search in Qdrant, one round-trip for all queries
+        responses = self.qdrant_client.query_batch_points(
             collection_name=self.faces_collection_name,
-            query_vector=query_embedding.tolist(),
-            limit=limit,
-            score_threshold=score_threshold
+            requests=requests
         )
 
         # Format results
-        face_results = []
-        for result in results:
-            face_results.append({
-                'photo_guid': result.payload['photo_guid'],
-                'photo_path': result.payload['photo_path'],
-                'photo_filename': result.payload['photo_filename'],
-                'face_index': result.payload['face_index'],
-                'bbox': result.payload['bbox'],
-                'confidence': result.payload['confidence'],
-                'person_name': result.payload['person_name'],
-                'similarity_score': result.score
-            })
+        for slot, query_key, response in zip(query_slots, query_keys, responses):
+            face_results[slot] = [
+                dict(zip(FACE_RESULT_FIELDS, _face_result_values(result.payload)),
+                     similarity_score=result.score)
+                for result in response.points
+            ]
+            self._cache_put(self._query_cache, query_key, list(face_results[slot]))
 
         return face_results
 
+    def _detect_cache_key(self, photo_path: Path) -> Optional[tuple]:
+        """Key detections by path and modification time; None if unreadable."""
+        try:
+            return (str(photo_path), Path(photo_path).stat().st_mtime_ns)
+        except OSError:
+            return None
+
+    @staticmethod
+    def _cache_get(cache: OrderedDict, key):
+        """Return the cached value for key, marking it recently used."""
+        if key is None or key not in cache:
+            return None
+        cache.move_to_end(key)
+        return cache[key]
+
+    @staticmethod
+    def _cache_put(cache: OrderedDict, key, value):
+        """Cache value under key, evicting the least recently used entry."""
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > SEARCH_CACHE_SIZE:
+            cache.popitem(last=False)
+
     def search_by_person_name(
         self,
         person_name: str,
@@ -113,23 +261,16 @@ class FaceSearcher:
             collection_name=self.faces_collection_name,
             scroll_filter=filter_condition,
             limit=limit,
-            with_payload=True,
+            with_payload=FACE_RESULT_FIELDS,
             with_vectors=False
         )
 
         # Format results (scroll returns tuple of (records, offset))
         records, _ = results
-        face_results = []
-        for record in records:
-            face_results.append({
-                'photo_guid': record.payload['photo_guid'],
-                'photo_path': record.payload['photo_path'],
-                'photo_filename': record.payload['photo_filename'],
-                'face_index': record.payload['face_index'],
-                'bbox': record.payload['bbox'],
-                'confidence': record.payload['confidence'],
-                'person_name': record.payload['person_name']
-            })
+        face_results = [
+            dict(zip(FACE_RESULT_FIELDS, _face_result_values(record.payload)))
+            for record in records
+        ]
 
         return face_results
 
@@ -155,15 +296,32 @@ class FaceSearcher:
             # Find the face point by combining photo GUID and face index
             face_id = Utils.guid_to_point_id(f"{photo_guid}_face_{face_index}")
 
-            # Update the face payload
+            # Update the face payload. The photo's faces are fetched
+            # independently of the write (concurrently when possible);
+            # the new name is patched into that list below.
+            if self._concurrent_requests:
+                faces_future = self._executor.submit(
+                    self.get_faces_for_photo, photo_guid, FACE_NAME_FIELDS)
+            else:
+                faces = self.get_faces_for_photo(photo_guid, FACE_NAME_FIELDS)
             self.qdrant_client.set_payload(
                 collection_name=self.faces_collection_name,
                 payload={'person_name': person_name},
                 points=[face_id]
             )
+            if self._concurrent_requests:
+                faces = faces_future.result()
+            for face in faces:
+                if face['face_index'] == face_index:
+                    previous_name = face['person_name']
+                    face['person_name'] = person_name
+                    self._note_person_name_change(previous_name, person_name)
 
             # Also update the photo's payload with all person names for text search
-            self._update_photo_person_names(photo_guid)
+            self._update_photo_person_names(photo_guid, faces)
+
+            # Cached search results may show the old name
+            self._query_cache.clear()
 
             return True
 
@@ -171,17 +329,115 @@ class FaceSearcher:
             self.log.err(f"Error tagging face: {e}")
             return False
 
-    def _update_photo_person_names(self, photo_guid: str):
+    def tag_faces(self, tags: List[Tuple[str, int, str]]) -> bool:
+        """Tag many detected faces at once.
+
+        Costs one face fetch, one face write per distinct person name,
+        and one photo write per distinct resulting set of names,
+        instead of several round-trips per face.
+
+        Args:
+            tags: (photo_guid, face_index, person_name) triples
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if not tags:
+            return True
+        try:
+            from common.utils import Utils
+
+            # Current names of all faces in the affected photos
+            photo_guids = list(dict.fromkeys(guid for guid, _, _ in tags))
+            faces_by_guid = self._get_faces_for_photos(photo_guids)
+
+            # One face write per person name
+            face_ids_by_name = defaultdict(list)
+            for photo_guid, face_index, person_name in tags:
+                face_ids_by_name[person_name].append(
+                    Utils.guid_to_point_id(f"{photo_guid}_face_{face_index}"))
+            for person_name, face_ids in face_ids_by_name.items():
+                self.qdrant_client.set_payload(
+                    collection_name=self.faces_collection_name,
+                    payload={'person_name': person_name},
+                    points=face_ids
+                )
+
+            # Apply the same changes to the fetched faces
+            for photo_guid, face_index, person_name in tags:
+                face = faces_by_guid[photo_guid].get(face_index)
+                previous_name = face['person_name'] if face else None
+                faces_by_guid[photo_guid][face_index] = {'face_index': face_index,
+                                                         'person_name': person_name}
+                self._note_person_name_change(previous_name, person_name)
+
+            # One photo write per distinct set of (lowercased) names
+            photo_ids_by_names = defaultdict(list)
+            for photo_guid in photo_guids:
+                person_names = frozenset(face['person_name'].lower()
+                                         for face in faces_by_guid[photo_guid].values()
+                                         if face['person_name'])
+                photo_ids_by_names[person_names].append(Utils.guid_to_point_id(photo_guid))
+            for person_names, photo_ids in photo_ids_by_names.items():
+                self.qdrant_client.set_payload(
+                    collection_name=self.photos_collection_name,
+                    payload={'person_names': list(person_names)},
+                    points=photo_ids
+                )
+
+            # Cached search results may show old names
+            self._query_cache.clear()
+
+            return True
+
+        except Exception as e:
+            self.log.err(f"Error tagging faces: {e}")
+            return False
+
+    def _get_faces_for_photos(self, photo_guids: List[str]) -> Dict[str, Dict[int, Dict]]:
+        """Fetch face_index and person_name of all faces of several photos.
+
+        Returns:
+            Dict mapping each photo GUID to a dict of its faces by face_index
+        """
+        faces_by_guid = {photo_guid: {} for photo_guid in photo_guids}
+        photo_filter = Filter(
+            must=[FieldCondition(key="photo_guid", match=MatchAny(any=photo_guids))]
+        )
+        offset = None
+        while True:
+            records, offset = self.qdrant_client.scroll(
+                collection_name=self.faces_collection_name,
+                scroll_filter=photo_filter,
+                limit=10000,
+                offset=offset,
+                with_payload=['photo_guid'] + FACE_NAME_FIELDS,
+                with_vectors=False
+            )
+            for record in records:
+                face_index = record.payload['face_index']
+                faces_by_guid[record.payload['photo_guid']][face_index] = {
+                    'face_index': face_index,
+                    'person_name': record.payload.get('person_name')
+                }
+            if offset is None:
+                break
+        return faces_by_guid
+
+    def _update_photo_person_names(self, photo_guid: str, faces: Optional[List[Dict]] = None):
         """Update the photo's payload with list of all tagged person names.
 
         Args:
             photo_guid: GUID of the photo
+            faces: The photo's faces as returned by get_faces_for_photo(),
+                if the caller already has them; fetched here if None
         """
         try:
             from common.utils import Utils
 
             # Get all faces for this photo
-            faces = self.get_faces_for_photo(photo_guid)
+            if faces is None:
+                faces = self.get_faces_for_photo(photo_guid, FACE_NAME_FIELDS)
 
             # Collect unique person names (excluding None)
             # Store in lowercase for case-insensitive search
@@ -193,7 +449,7 @@ class FaceSearcher:
             # Update the photo's payload in photo_embeddings collection
             photo_point_id = Utils.guid_to_point_id(photo_guid)
             self.qdrant_client.set_payload(
-                collection_name='photo_embeddings',
+                collection_name=self.photos_collection_name,
                 payload={'person_names': list(person_names)},
                 points=[photo_point_id]
             )
@@ -203,74 +459,151 @@ class FaceSearcher:
 
     def get_faces_for_photo(
         self,
-        photo_guid: str
+        photo_guid: str,
+        payload_fields: List[str] = FACE_LISTING_FIELDS
     ) -> List[Dict]:
         """Get all detected faces for a specific photo.
 
+        Face point IDs derive from the photo GUID and face index, so
+        when the photo records its face_count the faces are looked up
+        by ID; otherwise the faces collection is scanned by photo_guid.
+
         Args:
             photo_guid: GUID of the photo
+            payload_fields: Face payload fields to fetch and return;
+                must include 'face_index'
 
         Returns:
             List of face records
         """
-        filter_condition = Filter(
-            must=[
-                FieldCondition(
-                    key="photo_guid",
-                    match=MatchValue(value=photo_guid)
-                )
-            ]
-        )
+        from common.utils import Utils
 
-        results = self.qdrant_client.scroll(
-            collection_name=self.faces_collection_name,
-            scroll_filter=filter_condition,
-            limit=100,
-            with_payload=True,
+        records = None
+        photos = self.qdrant_client.retrieve(
+            collection_name=self.photos_collection_name,
+            ids=[Utils.guid_to_point_id(photo_guid)],
+            with_payload=['face_count'],
             with_vectors=False
         )
+        face_count = photos[0].payload.get('face_count') if photos else None
+        if face_count is not None:
+            face_ids = [Utils.guid_to_point_id(f"{photo_guid}_face_{i}")
+                        for i in range(face_count)]
+            retrieved = self.qdrant_client.retrieve(
+                collection_name=self.faces_collection_name,
+                ids=face_ids,
+                with_payload=payload_fields,
+                with_vectors=False
+            ) if face_ids else []
+            # IDs were requested in face_index order; keep that order
+            by_id = {record.id: record for record in retrieved}
+            records = [by_id[face_id] for face_id in face_ids if face_id in by_id]
+        else:
+            filter_condition = Filter(
+                must=[
+                    FieldCondition(
+                        key="photo_guid",
+                        match=MatchValue(value=photo_guid)
+                    )
+                ]
+            )
 
-        # Format results
-        records, _ = results
+            # Qdrant returns the faces sorted by face_index
+            records, _ = self.qdrant_client.scroll(
+                collection_name=self.faces_collection_name,
+                scroll_filter=filter_condition,
+                limit=100,
+                order_by=OrderBy(key='face_index', direction=Direction.ASC),
+                with_payload=payload_fields,
+                with_vectors=False
+            )
+
+        # Format results, already in face_index order
         face_results = []
         for record in records:
-            face_results.append({
-                'face_index': record.payload['face_index'],
-                'bbox': record.payload['bbox'],
-                'confidence': record.payload['confidence'],
-                'person_name': record.payload['person_name']
-            })
-
-        # Sort by face_index
-        face_results.sort(key=lambda x: x['face_index'])
+            face_results.append({field: record.payload.get(field) for field in payload_fields})
 
         return face_results
 
+    def _note_person_name_change(self, previous_name: Optional[str], person_name: str):
+        """Keep the cached person names current after a face is (re)tagged.
+
+        Tagging an untagged face just adds the name. A replaced name
+        may still be on other faces, which only a fresh query can tell,
+        so retagging drops the cache to be reloaded on next use.
+        """
+        if self._person_names is None:
+            return
+        if previous_name:
+            self._person_names = None
+        elif person_name:
+            self._person_names.add(person_name)
+
     def get_all_person_names(self) -> List[str]:
         """Get list of all unique person names that have been tagged.
 
+        The names are queried once and then served from memory;
+        tag_face() keeps them current.
+
         Returns:
             List of person names (excluding None)
         """
-        # Scroll through all faces and collect unique person names
+        if self._person_names is None:
+            self._person_names = set(self._query_person_names())
+        return sorted(self._person_names)
+
+    def _query_person_names(self) -> List[str]:
+        """Query Qdrant for all distinct tagged person names."""
+        # Let Qdrant aggregate the distinct names server-side
+        try:
+            response = self.qdrant_client.facet(
+                collection_name=self.faces_collection_name,
+                key='person_name',
+                limit=PERSON_NAME_FACET_LIMIT,
+                exact=True
+            )
+            return sorted(hit.value for hit in response.hits if hit.value)
+        except Exception as e:
+            # Qdrant before 1.12, or no keyword index on person_name
+            self.log.warn(f"Person name facet failed ({e}); scanning faces instead")
+
+        # Scroll through the tagged faces, fetching only the person names
+        tagged_filter = Filter(
+            must_not=[IsEmptyCondition(is_empty=PayloadField(key='person_name'))]
+        )
         person_names = set()
         offset = None
+        scanned = 0
+        unchanged_pages = 0
 
         while True:
             records, offset = self.qdrant_client.scroll(
                 collection_name=self.faces_collection_name,
-                limit=100,
+                scroll_filter=tagged_filter,
+                limit=10000,
                 offset=offset,
-                with_payload=True,
+                with_payload=['person_name'],
                 with_vectors=False
             )
 
+            names_before = len(person_names)
             for record in records:
                 person_name = record.payload.get('person_name')
                 if person_name:
                     person_names.add(person_name)
+            scanned += len(records)
 
             if offset is None:
                 break
 
+            # A few hundred people appear on many thousands of faces:
+            # stop once pages keep turning up no new names
+            unchanged_pages = unchanged_pages + 1 if len(person_names) == names_before else 0
+            if (unchanged_pages >= PERSON_NAME_SCAN_PATIENCE
+                    or scanned >= PERSON_NAME_MAX_SCAN):
+                self.log.warn(f"Stopped person name scan after {scanned} tagged faces; "
+                              f"names seen only on later faces are missing. "
+                              f"Upgrade Qdrant to 1.12+ for exact facet counts.")
+                break
+
         return sorted(list(person_names))
@@ -33,23 +33,64 @@ Example:
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import atexit
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, Optional
 import time
-import json
+
+from common.utils import Utils
+
+try:
+    # Optional: key the cache by H3 hexagonal grid cell
+    import h3
+except ImportError:
+    h3 = None
+
+# Persistent cache of geocoding results, shared across runs
+GEOCODE_CACHE_PATH = Path.home() / ".photo_index" / "geocache.db"
+# Cache writes are committed in groups of this many
+GEOCODE_COMMIT_EVERY = 32
+# batch_geocode() limits: concurrent requests, and requests per second
+# (Google allows ~50/sec; stay below that)
+GEOCODE_MAX_CONCURRENCY = 10
+GEOCODE_MAX_QPS = 40
+# H3 resolution for cache keys, e.g. 9 (cells ~0.1 km^2, ~175m across):
+# all photos within a cell share one lookup, at the cost of street-level
+# precision in formatted_address. None keys by coordinates rounded to
+# ~11m instead.
+GEOCODE_H3_RESOLUTION = None
 
 class Geocoder:
     """Reverse geocoding using Google Maps Geocoding API."""
     
     GOOGLE_GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
     
-    def __init__(self, api_key_path: str = None):
+    def __init__(self, 
+                 api_key_path: str = None,
+                 cache_path: Optional[str] = GEOCODE_CACHE_PATH,
+                 resolution: Optional[int] = GEOCODE_H3_RESOLUTION):
         """Initialize the geocoder.
         
         Args:
             api_key_path: Path to file containing Google Maps API key.
                          Defaults to $HOME/.ssh/googleMapsGeoCodingAPIKey.txt
+            cache_path: SQLite file that persists geocoding results
+                         across runs; None keeps them in memory only
+            resolution: H3 grid resolution whose cells key the cache,
+                         so nearby coordinates share a result; None
+                         keys by coordinates rounded to ~11m. Requires
+                         the h3 package.
         """
+        if resolution is not None and h3 is None:
+            print("h3 package not installed; keying geocoding cache by rounded coordinates")
+            resolution = None
+        self.resolution = resolution
+
         if api_key_path is None:
             api_key_path = Path.home() / ".ssh" / "googleMapsGeoCodingAPIKey.txt"
         else:
@@ -62,10 +103,84 @@ class Geocoder:
         except Exception as e:
             raise ValueError(f"Failed to read API key from {api_key_path}: {e}")
         
-        # Cache for geocoding results
+        # One HTTP session, so that requests reuse TLS connections;
+        # its pool holds a connection per batch_geocode() worker, and
+        # transient server errors are retried with backoff
+        self._session = requests.Session()
+        self._session.mount('https://', HTTPAdapter(
+            pool_connections=GEOCODE_MAX_CONCURRENCY,
+            pool_maxsize=GEOCODE_MAX_CONCURRENCY,
+            max_retries=Retry(total=3,
+                              backoff_factor=0.2,
+                              status_forcelist=(429, 500, 502, 503, 504))
+        ))
+        
+        # Spacing of API requests under batch_geocode()'s rate limit
+        self._rate_lock = threading.Lock()
+        self._next_request_time = 0.0
+        
+        # Cache for geocoding results: in memory, backed by SQLite
         self._cache = {}
         self._cache_hits = 0
         self._api_calls = 0
+        
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._pending_writes = 0
+        if cache_path is not None:
+            try:
+                self._open_db(Path(cache_path))
+            except sqlite3.Error as e:
+                print(f"Geocoding cache {cache_path} unavailable ({e}); caching in memory only")
+                self._db = None
+    
+    def _open_db(self, cache_path: Path):
+        """Open (creating if needed) the persistent geocoding cache."""
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(cache_path), check_same_thread=False)
+        # WAL lets other processes read while this one writes
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS geo (k TEXT PRIMARY KEY, v TEXT)")
+        self._db.commit()
+        atexit.register(self.close)
+    
+    def _db_get(self, cache_key: str) -> Optional[Dict]:
+        """Look up a result in the persistent cache; None on a miss."""
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute("SELECT v FROM geo WHERE k = ?", (cache_key,)).fetchone()
+        return Utils.json_loads(row[0]) if row else None
+    
+    def _db_put(self, cache_key: str, result: Dict):
+        """Add a result to the persistent cache, committing in groups."""
+        if self._db is None:
+            return
+        with self._db_lock:
+            self._db.execute("INSERT OR REPLACE INTO geo (k, v) VALUES (?, ?)",
+                             (cache_key, Utils.json_dumps(result)))
+            self._pending_writes += 1
+            if self._pending_writes >= GEOCODE_COMMIT_EVERY:
+                self._db.commit()
+                self._pending_writes = 0
+    
+    def flush(self):
+        """Commit pending writes to the persistent cache."""
+        if self._db is None:
+            return
+        with self._db_lock:
+            if self._pending_writes:
+                self._db.commit()
+                self._pending_writes = 0
+    
+    def close(self):
+        """Commit pending writes and close the persistent cache."""
+        if self._db is None:
+            return
+        self.flush()
+        with self._db_lock:
+            self._db.close()
+            self._db = None
     
     def get_location(self, latitude: float, longitude: float) -> Optional[Dict]:
         """Convert GPS coordinates to location information.
@@ -77,12 +192,12 @@ class Geocoder:
         Returns:
             Dictionary with location information or None on failure
         """
-        # Check cache (round to 4 decimal places ~11m precision)
-        cache_key = f"{latitude:.4f},{longitude:.4f}"
+        # Check cache (by H3 cell, or rounded to 4 decimal places ~11m precision)
+        cache_key = self._cache_key(latitude, longitude)
         
-        if cache_key in self._cache:
-            self._cache_hits += 1
-            return self._cache[cache_key]
+        result = self._cached_location(cache_key)
+        if result is not None:
+            return result
         
         # Make API request
         try:
@@ -91,17 +206,18 @@ class Geocoder:
                 'key': self.api_key
             }
             
-            response = requests.get(self.GOOGLE_GEOCODE_URL, params=params, timeout=10)
+            response = self._session.get(self.GOOGLE_GEOCODE_URL, params=params, timeout=10)
             response.raise_for_status()
             
             self._api_calls += 1
-            data = response.json()
+            data = Utils.json_loads(response.content)
             
             if data['status'] == 'OK' and data['results']:
                 result = self._parse_result(data['results'][0])
                 
                 # Cache the result
                 self._cache[cache_key] = result
+                self._db_put(cache_key, result)
                 
                 return result
             
@@ -123,6 +239,26 @@ class Geocoder:
             print(f"Geocoding error for {latitude}, {longitude}: {e}")
             return None
     
+    def _cache_key(self, latitude: float, longitude: float) -> str:
+        """Cache key for a location: its H3 cell, or coordinates rounded to ~11m."""
+        if self.resolution is not None:
+            # Prefixed, so cell keys never collide with coordinate keys
+            # in a shared persistent cache
+            return f"h3:{h3.latlng_to_cell(latitude, longitude, self.resolution)}"
+        return f"{latitude:.4f},{longitude:.4f}"
+    
+    def _cached_location(self, cache_key: str) -> Optional[Dict]:
+        """Look a location up in memory, then on disk; None on a miss."""
+        if cache_key in self._cache:
+            self._cache_hits += 1
+            return self._cache[cache_key]
+        
+        result = self._db_get(cache_key)
+        if result is not None:
+            self._cache[cache_key] = result
+            self._cache_hits += 1
+        return result
+    
     def _parse_result(self, result: Dict) -> Dict:
         """Parse Google Maps geocoding result.
         
@@ -172,7 +308,9 @@ class Geocoder:
         """Geocode multiple coordinates.
         
         Note: This makes individual API calls since Google Maps doesn't have
-        a batch geocoding endpoint. Results are cached.
+        a batch geocoding endpoint. Results are cached; coordinates that
+        are cached or repeated cost no API call. The remaining calls run
+        concurrently, at most GEOCODE_MAX_QPS per second.
         
         Args:
             coordinates: List of (latitude, longitude) tuples
@@ -180,17 +318,40 @@ class Geocoder:
         Returns:
             List of location dictionaries (same order as input)
         """
-        results = []
+        # Resolve each distinct location from the caches, in memory
+        # or on disk; only the rest cost an API call
+        keys = [self._cache_key(lat, lon) for lat, lon in coordinates]
+        resolved = {}
+        to_fetch = {}
+        for cache_key, (lat, lon) in zip(keys, coordinates):
+            if cache_key in resolved or cache_key in to_fetch:
+                continue
+            result = self._cached_location(cache_key)
+            if result is not None:
+                resolved[cache_key] = result
+            else:
+                to_fetch[cache_key] = (lat, lon)
         
-        for lat, lon in coordinates:
-            result = self.get_location(lat, lon)
-            results.append(result)
-            
-            # Small delay to be respectful of API limits
-            # Google Maps allows ~50 req/sec, but we'll be conservative
-            time.sleep(0.05)
+        if to_fetch:
+            with ThreadPoolExecutor(max_workers=GEOCODE_MAX_CONCURRENCY) as pool:
+                futures = {
+                    cache_key: pool.submit(self._rate_limited_location, lat, lon)
+                    for cache_key, (lat, lon) in to_fetch.items()
+                }
+                for cache_key, future in futures.items():
+                    resolved[cache_key] = future.result()
         
-        return results
+        return [resolved[cache_key] for cache_key in keys]
+    
+    def _rate_limited_location(self, latitude: float, longitude: float) -> Optional[Dict]:
+        """get_location(), waiting as needed to stay under GEOCODE_MAX_QPS."""
+        with self._rate_lock:
+            now = time.monotonic()
+            start = max(now, self._next_request_time)
+            self._next_request_time = start + 1.0 / GEOCODE_MAX_QPS
+        if start > now:
+            time.sleep(start - now)
+        return self.get_location(latitude, longitude)
     
     def get_stats(self) -> Dict:
         """Get geocoding statistics.
@@ -198,22 +359,29 @@ class Geocoder:
         Returns:
             Dictionary with cache and API call statistics
         """
+        cache_size = len(self._cache)
+        if self._db is not None:
+            with self._db_lock:
+                cache_size = self._db.execute("SELECT COUNT(*) FROM geo").fetchone()[0]
         return {
-            'cache_size': len(self._cache),
+            'cache_size': cache_size,
             'cache_hits': self._cache_hits,
             'api_calls': self._api_calls,
             'total_requests': self._cache_hits + self._api_calls
         }
     
     def save_cache(self, cache_path: str):
-        """Save geocoding cache to disk.
+        """Save geocoding cache to disk as JSON.
+        
+        Only the entries held in memory are saved; the persistent
+        cache needs no saving.
         
         Args:
             cache_path: Path to save cache file
         """
         try:
             with open(cache_path, 'w') as f:
-                json.dump(self._cache, f, indent=2)
+                f.write(Utils.json_dumps_pretty(self._cache))
             print(f"Saved geocoding cache to {cache_path} ({len(self._cache)} entries)")
         except Exception as e:
             print(f"Error saving cache: {e}")
@@ -221,12 +389,18 @@ class Geocoder:
     def load_cache(self, cache_path: str):
         """Load geocoding cache from disk.
         
+        Entries are also added to the persistent cache, so this
+        migrates a JSON cache written by save_cache().
+        
         Args:
             cache_path: Path to cache file
         """
         try:
-            with open(cache_path, 'r') as f:
-                self._cache = json.load(f)
+            with open(cache_path, 'rb') as f:
+                self._cache = Utils.json_loads(f.read())
+            for cache_key, result in self._cache.items():
+                self._db_put(cache_key, result)
+            self.flush()
             print(f"Loaded geocoding cache from {cache_path} ({len(self._cache)} entries)")
         except FileNotFoundError:
             print(f"Cache file not found: {cache_path}")
@@ -19,8 +19,14 @@ import argparse
 import sys
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import List, Set, Optional
+from typing import Iterator, List, Set, Optional
 import time
+import random
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+import grpc
+from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
+from qdrant_client.models import OptimizersConfigDiff
 
 # Assuming photo_indexer package structure
 from photo_index.photo_indexer import PhotoIndexer
@@ -29,6 +35,164 @@ from common.config import PHOTO_DIR
 
 from logging_service import LoggingService
 
+# Number of point IDs looked up per retrieve() request
+INDEXED_CHECK_CHUNK_SIZE = 1000
+
+# Incremental runs look up candidate photos by ID rather than
+# scrolling the whole collection while there are fewer than this
+# many candidates per indexed photo
+INDEXED_CHECK_MAX_RATIO = 10
+
+# Points per scroll request when collecting all indexed GUIDs
+GUID_SCROLL_PAGE_SIZE = 8192
+
+# Runs indexing at least this many photos defer HNSW indexing
+# until all points are loaded
+BULK_LOAD_MIN_PHOTOS = 1000
+# Qdrant's indexing threshold (KB of vectors per segment), restored
+# after a bulk load if the collection does not report its own
+DEFAULT_INDEXING_THRESHOLD = 10000
+
+# Threads computing photo GUIDs (file reads and hashing), and the
+# number of photos handed to them at a time
+GUID_MAX_WORKERS = 16
+GUID_CHUNK_SIZE = 1000
+
+# Attempts per upsert when Qdrant is overloaded or unreachable, and
+# the base of the randomized exponential backoff between them (seconds)
+UPSERT_MAX_ATTEMPTS = 5
+UPSERT_BACKOFF_BASE = 0.5
+# gRPC status codes of failed requests worth retrying
+TRANSIENT_GRPC_CODES = frozenset({
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+})
+
+
+def _is_transient_error(e: Exception) -> bool:
+    """Whether a failed Qdrant request is worth retrying."""
+    if isinstance(e, UnexpectedResponse):
+        # Rate limited or server-side trouble
+        return e.status_code == 429 or e.status_code >= 500
+    if isinstance(e, grpc.RpcError):
+        return e.code() in TRANSIENT_GRPC_CODES
+    # Connection failures and timeouts
+    return isinstance(e, (ResponseHandlingException, TimeoutError))
+
+
+def _upsert_with_retry(client, collection_name: str, points: List, wait: bool = True,
+                       max_attempts: int = UPSERT_MAX_ATTEMPTS):
+    """Upsert points, retrying transient failures.
+    
+    Sleeps a random time of up to UPSERT_BACKOFF_BASE * 2**attempt
+    seconds between attempts, so parallel writers don't retry in
+    lockstep. The last attempt always waits for Qdrant to apply the
+    points.
+    
+    Args:
+        client: QdrantClient
+        collection_name: Collection to upsert into
+        points: Points to upsert
+        wait: Whether earlier attempts wait for the points to be applied
+        max_attempts: Maximum number of attempts
+        
+    Raises:
+        The last error if all attempts fail, or any non-transient error
+    """
+    for attempt in range(max_attempts):
+        last_attempt = attempt == max_attempts - 1
+        try:
+            return client.upsert(
+                collection_name=collection_name,
+                points=points,
+                wait=wait or last_attempt
+            )
+        except Exception as e:
+            if last_attempt or not _is_transient_error(e):
+                raise
+            time.sleep(random.uniform(0, UPSERT_BACKOFF_BASE * 2 ** attempt))
+
+
+@contextmanager
+def _indexing_deferred(indexer: PhotoIndexer, collection_names: List[str]):
+    """Switch off HNSW indexing of collections for a bulk load.
+    
+    Sets each collection's indexing threshold to 0 and restores
+    the previous threshold on exit, whereupon Qdrant indexes the
+    loaded segments. Collections whose threshold cannot be changed,
+    e.g. in local mode, are left as they are.
+    
+    Args:
+        indexer: PhotoIndexer instance
+        collection_names: Collections about to receive many points
+    """
+    client = indexer.qdrant_client
+    saved_thresholds = {}
+    for collection_name in collection_names:
+        try:
+            optimizer_config = client.get_collection(collection_name).config.optimizer_config
+            client.update_collection(
+                collection_name=collection_name,
+                optimizer_config=OptimizersConfigDiff(indexing_threshold=0)
+            )
+        except Exception as e:
+            indexer.log.warn(f"Could not defer indexing of {collection_name}: {e}")
+            continue
+        saved_thresholds[collection_name] = (optimizer_config.indexing_threshold
+                                             or DEFAULT_INDEXING_THRESHOLD)
+    try:
+        yield
+    finally:
+        for collection_name, threshold in saved_thresholds.items():
+            try:
+                client.update_collection(
+                    collection_name=collection_name,
+                    optimizer_config=OptimizersConfigDiff(indexing_threshold=threshold)
+                )
+            except Exception as e:
+                indexer.log.err(f"Could not restore indexing threshold {threshold} "
+                                f"of {collection_name}: {e}")
+
+
+def _guid_or_none(photo_path: Path) -> Optional[str]:
+    """The GUID of a photo; None, with a warning, if it cannot be computed."""
+    try:
+        return Utils.get_photo_guid(photo_path)
+    except Exception as e:
+        print(f"Warning: Could not check {photo_path.name}: {e}")
+        return None
+
+
+def _iter_photo_guids(photo_paths: List[Path]) -> Iterator[Optional[str]]:
+    """Compute the GUIDs of photos on a thread pool, lazily.
+    
+    Hashing releases the GIL, so files are read and hashed in
+    parallel; GUIDs cached by Utils.get_photo_guid() cost no hashing.
+    Photos are submitted GUID_CHUNK_SIZE at a time, the next chunk
+    while the current one is consumed, so only two chunks of work
+    are pending however many photos there are.
+    
+    Args:
+        photo_paths: Paths to photo files
+        
+    Returns:
+        Iterator over the GUIDs in the order of photo_paths; None for
+        photos whose GUID could not be computed
+    """
+    chunks = (photo_paths[i:i + GUID_CHUNK_SIZE]
+              for i in range(0, len(photo_paths), GUID_CHUNK_SIZE))
+    with ThreadPoolExecutor(max_workers=GUID_MAX_WORKERS) as pool:
+        futures = [pool.submit(_guid_or_none, photo_path) for photo_path in next(chunks, [])]
+        for chunk in chunks:
+            next_futures = [pool.submit(_guid_or_none, photo_path) for photo_path in chunk]
+            for future in futures:
+                yield future.result()
+            futures = next_futures
+        for future in futures:
+            yield future.result()
+
+
 def check_photo_indexed(indexer: PhotoIndexer, photo_path: Path) -> bool:
     """Check if a photo is already indexed by GUID.
     
@@ -39,86 +203,90 @@ def check_photo_indexed(indexer: PhotoIndexer, photo_path: Path) -> bool:
     Returns:
         True if photo is indexed, False otherwise
     """
-    try:
-        guid = Utils.get_photo_guid(photo_path)
-        point_id = Utils.guid_to_point_id(guid)
-        
-        # Try to retrieve the point
-        results = indexer.qdrant_client.retrieve(
-            collection_name=indexer.collection_name,
-            ids=[point_id],
-            with_payload=False,
-            with_vectors=False
-        )
-        
-        return len(results) > 0
-        
-    except Exception as e:
-        print(f"Error checking if {photo_path.name} is indexed: {e}")
-        return False
+    return photo_path in check_photos_indexed_bulk(indexer, [photo_path])
 
 
-def get_indexed_guids(indexer: PhotoIndexer) -> Set[str]:
-    """Get set of all indexed photo GUIDs.
+def check_photos_indexed_bulk(indexer: PhotoIndexer, photo_paths: List[Path]) -> Set[Path]:
+    """Check which of several photos are already indexed by GUID.
+    
+    Point IDs are computed locally and looked up with one retrieve
+    request per INDEXED_CHECK_CHUNK_SIZE photos, each chunk as soon
+    as its GUIDs are ready.
     
     Args:
         indexer: PhotoIndexer instance
+        photo_paths: Paths to photo files
         
     Returns:
-        Set of GUIDs
+        Set of the paths whose photos are indexed. Photos that
+        could not be checked are treated as not indexed.
     """
-    guids = set()
-    
-    try:
-        offset = None
-        while True:
-            records, offset = indexer.qdrant_client.scroll(
+    indexed = set()
+    guids = _iter_photo_guids(photo_paths)
+    for i in range(0, len(photo_paths), INDEXED_CHECK_CHUNK_SIZE):
+        paths_by_id = {}
+        # zip() stops at the end of the chunk without taking another GUID
+        for photo_path, guid in zip(photo_paths[i:i + INDEXED_CHECK_CHUNK_SIZE], guids):
+            if guid is not None:
+                paths_by_id.setdefault(Utils.guid_to_point_id(guid), []).append(photo_path)
+        if not paths_by_id:
+            continue
+        try:
+            results = indexer.qdrant_client.retrieve(
                 collection_name=indexer.collection_name,
-                limit=100,
-                offset=offset,
-                with_payload=True,
+                ids=list(paths_by_id),
+                with_payload=False,
                 with_vectors=False
             )
-            
-            if not records:
-                break
-            
-            for record in records:
-                if 'guid' in record.payload:
-                    guids.add(record.payload['guid'])
-            
-            if offset is None:
-                break
-                
-    except Exception as e:
-        print(f"Error getting indexed GUIDs: {e}")
+        except Exception as e:
+            print(f"Error checking which photos are indexed: {e}")
+            continue
+        for record in results:
+            indexed.update(paths_by_id[record.id])
     
-    return guids
+    return indexed
 
 
-def filter_photos_by_date(photos: List[Path], since_date: datetime) -> List[Path]:
-    """Filter photos by modification date.
+def get_indexed_guids(indexer: PhotoIndexer) -> Set[str]:
+    """Get set of all indexed photo GUIDs.
     
     Args:
-        photos: List of photo paths
-        since_date: Only include photos modified after this date
+        indexer: PhotoIndexer instance
         
     Returns:
-        Filtered list of photos
+        Set of GUIDs
     """
-    filtered = []
+    guids = set()
     
-    for photo in photos:
-        try:
-            mtime = datetime.fromtimestamp(photo.stat().st_mtime)
-            if mtime >= since_date:
-                filtered.append(photo)
-        except Exception as e:
-            print(f"Warning: Could not check date for {photo.name}: {e}")
-            # Include it anyway to be safe
-            filtered.append(photo)
+    def fetch_page(offset):
+        return indexer.qdrant_client.scroll(
+            collection_name=indexer.collection_name,
+            limit=GUID_SCROLL_PAGE_SIZE,
+            offset=offset,
+            with_payload=['guid'],
+            with_vectors=False
+        )
     
-    return filtered
+    try:
+        # Request the next page before collecting the GUIDs of the
+        # current one, so the two overlap
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            records, offset = fetch_page(None)
+            while records:
+                next_page = prefetcher.submit(fetch_page, offset) if offset is not None else None
+                
+                for record in records:
+                    if 'guid' in record.payload:
+                        guids.add(record.payload['guid'])
+                
+                if next_page is None:
+                    break
+                records, offset = next_page.result()
+                
+    except Exception as e:
+        print(f"Error getting indexed GUIDs: {e}")
+    
+    return guids
 
 
 def index_single_file(
@@ -172,40 +340,15 @@ def index_single_file(
                 payload=result['payload']
             )
 
-            indexer.qdrant_client.upsert(
-                collection_name=indexer.collection_name,
-                points=[photo_point]
-            )
+            _upsert_with_retry(indexer.qdrant_client, indexer.collection_name, [photo_point])
 
             # Create and upload face points if faces were detected
             if result.get('detected_faces') and indexer.enable_face_detection:
-                face_points = []
-                for face in result['detected_faces']:
-                    # Generate unique ID for this face (combine photo GUID and face index)
-                    face_id = Utils.guid_to_point_id(f"{guid}_face_{face.face_index}")
-
-                    face_point = PointStruct(
-                        id=face_id,
-                        vector=face.embedding.tolist(),
-                        payload={
-                            'photo_guid': guid,
-                            'photo_path': str(file_path),
-                            'photo_filename': file_path.name,
-                            'face_index': face.face_index,
-                            'bbox': face.bbox,
-                            'confidence': face.confidence,
-                            'person_name': None,  # To be tagged by user later
-                        }
-                    )
-
-                    face_points.append(face_point)
+                face_points = indexer.make_face_points(guid, file_path, result['detected_faces'])
 
                 # Upload face points to the faces collection
                 if face_points:
-                    indexer.qdrant_client.upsert(
-                        collection_name='photo_faces',
-                        points=face_points
-                    )
+                    _upsert_with_retry(indexer.qdrant_client, 'photo_faces', face_points)
                     print(f"  → Detected and indexed {len(face_points)} face(s)")
 
             print(f"✓ Successfully indexed: {file_path.name}")
@@ -235,45 +378,48 @@ def index_incremental(
         since_date: Only index photos modified after this date
         dry_run: Preview what would be indexed without actually indexing
     """
-    # Find all photos
-    print(f"Scanning {indexer.photo_dir}...")
-    photo_paths = indexer.find_photos()
+    # Find all photos, filtered by date during the scan if requested
+    if since_date:
+        print(f"Scanning {indexer.photo_dir} for photos modified since {since_date.date()}...")
+        photo_paths = indexer.find_photos(since_ts=since_date.timestamp())
+    else:
+        print(f"Scanning {indexer.photo_dir}...")
+        photo_paths = indexer.find_photos()
     
     if not photo_paths:
         print("No photos found to index")
         return
     
-    print(f"Found {len(photo_paths)} total photos")
-    
-    # Filter by date if requested
-    if since_date:
-        print(f"Filtering photos modified since {since_date.date()}...")
-        photo_paths = filter_photos_by_date(photo_paths, since_date)
-        print(f"  → {len(photo_paths)} photos match date filter")
+    print(f"Found {len(photo_paths)} {'matching' if since_date else 'total'} photos")
     
     # Skip already indexed unless forcing
     if not force:
         print("Checking which photos are already indexed...")
-        indexed_guids = get_indexed_guids(indexer)
-
-        # Filter out already indexed
-        to_index = []
-        already_indexed_count = 0
-        for photo in photo_paths:
-            try:
-                guid = Utils.get_photo_guid(photo)
-                if guid not in indexed_guids:
+        total_in_index = indexer.qdrant_client.count(
+            collection_name=indexer.collection_name
+        ).count
+
+        if len(photo_paths) < INDEXED_CHECK_MAX_RATIO * total_in_index:
+            # Look up just the candidates by ID
+            indexed_paths = check_photos_indexed_bulk(indexer, photo_paths)
+            to_index = [photo for photo in photo_paths if photo not in indexed_paths]
+            already_indexed_count = len(photo_paths) - len(to_index)
+        else:
+            indexed_guids = get_indexed_guids(indexer)
+
+            # Filter out already indexed
+            to_index = []
+            already_indexed_count = 0
+            for photo, guid in zip(photo_paths, _iter_photo_guids(photo_paths)):
+                # Include photos that could not be checked, to be safe
+                if guid is None or guid not in indexed_guids:
                     to_index.append(photo)
                 else:
                     already_indexed_count += 1
-            except Exception as e:
-                print(f"Warning: Could not check {photo.name}: {e}")
-                to_index.append(photo)  # Include it to be safe
 
         print(f"  → {already_indexed_count} of {len(photo_paths)} found photos already indexed")
 
         # Check for orphaned entries in index (photos that no longer exist on disk)
-        total_in_index = len(indexed_guids)
         if total_in_index > already_indexed_count:
             orphaned = total_in_index - already_indexed_count
             print(f"  → {orphaned} indexed photo(s) no longer found on disk")
@@ -301,49 +447,65 @@ def index_incremental(
     print(f"\nIndexing {len(photo_paths)} photos...")
     
     from tqdm import tqdm
-    from qdrant_client.models import PointStruct
     
     success_count = 0
     error_count = 0
     
-    # Process in batches
+    # Process in batches. index_batch() embeds each batch with batched
+    # vision forward passes (decoding the next chunk meanwhile) and
+    # detects its faces together, rather than photo by photo.
     batch_size = indexer.batch_size
     
-    for i in tqdm(range(0, len(photo_paths), batch_size), desc="Processing batches"):
-        batch = photo_paths[i:i + batch_size]
-        points = []
-        
-        for photo_path in batch:
+    def upload(points, face_points):
+        # wait=False: return once Qdrant has logged the points
+        # rather than after it has applied them
+        if points:
             try:
-                result = indexer.index_photo(photo_path)
-                
-                if result:
-                    point_id = Utils.guid_to_point_id(result['payload']['guid'])
-                    
-                    point = PointStruct(
-                        id=point_id,
-                        vector=result['embedding'].tolist(),
-                        payload=result['payload']
-                    )
-                    
-                    points.append(point)
-                    success_count += 1
-                else:
-                    error_count += 1
-                    
+                _upsert_with_retry(indexer.qdrant_client, indexer.collection_name,
+                                   points, wait=False)
             except Exception as e:
-                print(f"\nError processing {photo_path.name}: {e}")
-                error_count += 1
+                indexer.log.err(f"Error uploading batch to Qdrant: {e}")
         
-        # Upload batch to Qdrant
-        if points:
+        if face_points and indexer.enable_face_detection:
             try:
-                indexer.qdrant_client.upsert(
-                    collection_name=indexer.collection_name,
-                    points=points
-                )
+                _upsert_with_retry(indexer.qdrant_client, indexer.faces_collection_name,
+                                   face_points, wait=False)
             except Exception as e:
-                print(f"\nError uploading batch to Qdrant: {e}")
+                indexer.log.err(f"Error uploading faces to Qdrant: {e}")
+    
+    # Large runs load the points with HNSW indexing switched off, so
+    # Qdrant builds each index once at the end rather than repeatedly
+    # as segments fill up
+    if len(photo_paths) >= BULK_LOAD_MIN_PHOTOS:
+        indexing_context = _indexing_deferred(
+            indexer, [indexer.collection_name, indexer.faces_collection_name])
+    else:
+        indexing_context = nullcontext()
+    
+    with indexing_context:
+        # Each batch uploads in the background while the next one is
+        # embedded; at most one upload is in flight
+        with ThreadPoolExecutor(max_workers=1) as uploader:
+            pending_upload = None
+            # Errors go to the indexer's log; the progress bar redraws
+            # at most twice a second
+            for i in tqdm(range(0, len(photo_paths), batch_size),
+                          desc="Processing batches", mininterval=0.5):
+                batch = photo_paths[i:i + batch_size]
+                
+                try:
+                    points, face_points = indexer.index_batch(batch)
+                except Exception as e:
+                    indexer.log.err(f"Error processing batch starting at {batch[0].name}: {e}")
+                    error_count += len(batch)
+                    continue
+                
+                success_count += len(points)
+                error_count += len(batch) - len(points)
+                
+                if pending_upload is not None:
+                    pending_upload.result()
+                pending_upload = uploader.submit(upload, points, face_points)
 
     # Calculate elapsed time
     elapsed_seconds = time.time() - start_time
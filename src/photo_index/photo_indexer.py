@@ -6,17 +6,24 @@
 # @Last Modified time: 2025-11-29 14:34:05
 """Main photo indexing system."""
 
+import os
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import json
 from datetime import datetime
+import numpy as np
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, PayloadSchemaType,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    IntegerIndexParams, IntegerIndexType
+)
 
 from logging_service import LoggingService
 
 from common.config import (
-    PHOTO_DIR, QDRANT_PATH, COLLECTION_NAME, QDRANT_HOST, QDRANT_PORT,
+    PHOTO_DIR, QDRANT_PATH, COLLECTION_NAME, QDRANT_HOST, QDRANT_PORT, QDRANT_GRPC_PORT,
     EMBEDDING_DIM, MODEL_NAME, DEVICE, BATCH_SIZE, IMAGE_EXTENSIONS, VIDEO_EXTENSIONS,
     GEN_IMG_DESCRIPTIONS, IMG_DESC_PROMPT
 )
@@ -24,7 +31,7 @@ from photo_index.exif_utils import ExifExtractor
 from photo_index.embedding_generator import EmbeddingGenerator
 from photo_index.mac_metadata import MacMetadataExtractor
 from photo_index.geocoding import Geocoder
-from photo_index.face_detector import FaceDetector
+from photo_index.face_detector import DetectedFace, get_face_detector
 from common.utils import Utils, timed
 
 try:
@@ -34,6 +41,71 @@ except ImportError:
     DescriptionParser = None
 
 
+# Threads scanning the photo directory's subdirectories in find_photos()
+SCAN_MAX_WORKERS = 8
+
+
+def _scan_dir(root: str,
+              extensions: tuple,
+              since_ts: Optional[float] = None) -> Tuple[List[Path], List[str]]:
+    """List one directory: its non-hidden files whose names end in one
+    of the (lowercase) extensions, and its non-hidden subdirectories.
+
+    os.scandir() entries carry the file type from the directory
+    listing, so unlike Path.rglob() plus is_file() this costs no
+    stat() call per file. Only a since_ts (POSIX timestamp) filter
+    stats the matching files, to skip those modified before it.
+    """
+    photo_paths = []
+    subdirs = []
+    try:
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.lower().endswith(extensions) and entry.is_file():
+                    if since_ts is not None:
+                        try:
+                            if entry.stat().st_mtime < since_ts:
+                                continue
+                        except OSError:
+                            # Include it anyway to be safe
+                            pass
+                    photo_paths.append(Path(entry.path))
+    except OSError:
+        # Unreadable directory; skip it like rglob() does
+        pass
+    return photo_paths, subdirs
+
+
+def _scan_photos(root: str,
+                 extensions: tuple,
+                 since_ts: Optional[float] = None) -> Iterator[Path]:
+    """Recursively yield the photos below root, one directory at a time.
+    See _scan_dir() for the arguments."""
+    photo_paths, subdirs = _scan_dir(root, extensions, since_ts)
+    yield from photo_paths
+    for subdir in subdirs:
+        yield from _scan_photos(subdir, extensions, since_ts)
+
+
+def _scan_photos_parallel(root: str,
+                          extensions: tuple,
+                          since_ts: Optional[float] = None,
+                          max_workers: int = SCAN_MAX_WORKERS) -> List[Path]:
+    """List the photos below root, scanning each of root's
+    subdirectories on its own thread (scandir releases the GIL
+    while it waits on the file system)."""
+    photo_paths, subdirs = _scan_dir(root, extensions, since_ts)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for subtree_paths in pool.map(lambda subdir: list(_scan_photos(subdir, extensions, since_ts)),
+                                      subdirs):
+            photo_paths.extend(subtree_paths)
+    return photo_paths
+
+
 class PhotoIndexer:
     """Main photo indexing class that coordinates all indexing operations."""
     
@@ -48,7 +120,8 @@ class PhotoIndexer:
         device: str = DEVICE,
         batch_size: int = BATCH_SIZE,
         enable_geocoding: bool = True,
-        enable_face_detection: bool = True
+        enable_face_detection: bool = True,
+        quantize_face_vectors: bool = True
     ):
         """Initialize the photo indexer.
 
@@ -63,6 +136,9 @@ class PhotoIndexer:
             batch_size: Batch size for processing
             enable_geocoding: Whether to enable GPS to location conversion
             enable_face_detection: Whether to enable face detection
+            quantize_face_vectors: Whether a newly created faces collection
+                keeps an int8 scalar-quantized copy of its vectors in RAM
+                for search (originals are used for rescoring)
         """
         self.photo_dir = Path(photo_dir)
         self.collection_name = collection_name
@@ -70,6 +146,7 @@ class PhotoIndexer:
         self.batch_size = batch_size
         self.enable_geocoding = enable_geocoding
         self.enable_face_detection = enable_face_detection
+        self.quantize_face_vectors = quantize_face_vectors
 
         self.log = LoggingService()
 
@@ -84,7 +161,14 @@ class PhotoIndexer:
         if qdrant_host and qdrant_port:
             try:
                 self.log.info(f"Attempting to connect to Qdrant server: {qdrant_host}:{qdrant_port}")
-                self.qdrant_client = QdrantClient(host=qdrant_host, port=qdrant_port)
+                # gRPC sends point vectors as packed floats rather
+                # than JSON number lists
+                self.qdrant_client = QdrantClient(
+                    host=qdrant_host,
+                    port=qdrant_port,
+                    grpc_port=QDRANT_GRPC_PORT,
+                    prefer_grpc=True
+                )
                 # Test connection
                 self.qdrant_client.get_collections()
                 self.log.info(f"✓ Connected to Qdrant server")
@@ -121,14 +205,19 @@ class PhotoIndexer:
         self.face_detector = None
         if self.enable_face_detection:
             try:
-                self.face_detector = FaceDetector()
+                self.face_detector = get_face_detector()
             except Exception as e:
                 self.log.warn(f"Warning: Could not initialize face detector: {e}")
                 self.log.info("Continuing without face detection functionality")
                 self.enable_face_detection = False
 
         # Embedding generator
-        self.embedding_generator = EmbeddingGenerator(model_name, device)
+        # The language model is only needed for descriptions
+        self.embedding_generator = EmbeddingGenerator(
+            model_name,
+            device,
+            mode="both" if GEN_IMG_DESCRIPTIONS == 1 else "embed"
+        )
         
         # Get actual embedding dimension from model
         self.embedding_dim = self.embedding_generator.get_embedding_dim()
@@ -158,6 +247,13 @@ class PhotoIndexer:
                 )
             )
             self.log.info("Collection created")
+        # Keyword index on person_names, which name searches and
+        # check_person_names filter on; a no-op if it already exists
+        self.qdrant_client.create_payload_index(
+            collection_name=self.collection_name,
+            field_name='person_names',
+            field_schema=PayloadSchemaType.KEYWORD
+        )
 
         # Create faces collection if needed
         if self.enable_face_detection:
@@ -170,41 +266,86 @@ class PhotoIndexer:
                     vectors_config=VectorParams(
                         size=512,  # InsightFace buffalo_l produces 512-dim embeddings
                         distance=Distance.COSINE
-                    )
+                    ),
+                    quantization_config=ScalarQuantization(
+                        scalar=ScalarQuantizationConfig(
+                            type=ScalarType.INT8,
+                            always_ram=True
+                        )
+                    ) if self.quantize_face_vectors else None
                 )
                 self.log.info("Faces collection created")
+            # Keyword index on person_name, which FaceSearcher filters
+            # and facets on; a no-op if it already exists
+            self.qdrant_client.create_payload_index(
+                collection_name=self.faces_collection_name,
+                field_name='person_name',
+                field_schema=PayloadSchemaType.KEYWORD
+            )
+            # Indexes for listing a photo's faces by photo_guid, ordered
+            # by face_index (ordering requires a range-capable index)
+            self.qdrant_client.create_payload_index(
+                collection_name=self.faces_collection_name,
+                field_name='photo_guid',
+                field_schema=PayloadSchemaType.KEYWORD
+            )
+            self.qdrant_client.create_payload_index(
+                collection_name=self.faces_collection_name,
+                field_name='face_index',
+                field_schema=IntegerIndexParams(
+                    type=IntegerIndexType.INTEGER,
+                    lookup=True,
+                    range=True
+                )
+            )
     
-    def find_photos(self) -> List[Path]:
+    def find_photos(self, since_ts: Optional[float] = None) -> List[Path]:
         """Find all photo files in the photo directory.
         
+        Args:
+            since_ts: If given, only find photos modified at or
+                after this POSIX timestamp
+        
         Returns:
-            List of paths to photo files
+            Sorted list of paths to photo files
         """
         self.log.info(f"Scanning {self.photo_dir} for photos...")
         
-        photo_paths = []
-        # rglob('*') walks the tree exactly once
-        for file_path in self.photo_dir.rglob("*"):
-            # Filter out hidden files OR directories
-            # This checks if any part of the path (folder or filename) starts with '.'
-            if any(part.startswith('.') for part in file_path.parts):
-                continue
-
-            # Is file a photo?
-            if file_path.is_file() and file_path.suffix.lower() in IMAGE_EXTENSIONS:
-                photo_paths.append(file_path)            
-
-        # Filter out AppleDouble files
-        photo_paths = [p for p in photo_paths if not p.name.startswith('._')]
+        photo_paths = sorted(_scan_photos_parallel(str(self.photo_dir),
+                                                   tuple(IMAGE_EXTENSIONS),
+                                                   since_ts))
         
         self.log.info(f"Found {len(photo_paths)} photos")
-        return sorted(photo_paths)
+        return photo_paths
+    
+    def iter_photos(self, since_ts: Optional[float] = None) -> Iterator[Path]:
+        """Lazily yield the photo files in the photo directory, unsorted.
+        
+        Hidden files and directories (names starting with '.',
+        which includes AppleDouble '._' files) are skipped.
+        
+        Args:
+            since_ts: If given, only yield photos modified at or
+                after this POSIX timestamp
+        
+        Returns:
+            Iterator over paths to photo files
+        """
+        return _scan_photos(str(self.photo_dir), tuple(IMAGE_EXTENSIONS), since_ts)
     
-    def index_photo(self, photo_path: Path) -> Optional[Dict]:
+    def index_photo(self, 
+                    photo_path: Path, 
+                    embedding: Optional[np.ndarray] = None,
+                    detected_faces: Optional[List[DetectedFace]] = None) -> Optional[Dict]:
         """Index a single photo.
         
         Args:
             photo_path: Path to the photo file
+            embedding: The photo's embedding, if already computed
+                as part of a batch; computed here if None
+            detected_faces: The photo's faces, if already detected
+                as part of a batch; detected here if None and face
+                detection is enabled
             
         Returns:
             Dictionary containing indexed data or None on failure
@@ -214,7 +355,8 @@ class PhotoIndexer:
             guid = Utils.get_photo_guid(photo_path)
             
             # Generate embedding
-            embedding = self.embedding_generator.generate_embedding(photo_path)
+            if embedding is None:
+                embedding = self.embedding_generator.generate_embedding(photo_path)
             
             # Generate description (if requested in config)
             description = None
@@ -299,11 +441,11 @@ class PhotoIndexer:
                     )
 
             # Detect faces if enabled
-            detected_faces = []
-            face_count = 0
-            if self.enable_face_detection and self.face_detector:
-                detected_faces = self.face_detector.detect_faces(photo_path)
-                face_count = len(detected_faces)
+            if detected_faces is None:
+                detected_faces = []
+                if self.enable_face_detection and self.face_detector:
+                    detected_faces = self.face_detector.detect_faces(photo_path)
+            face_count = len(detected_faces)
 
             # Build payload
             payload = {
@@ -402,8 +544,27 @@ class PhotoIndexer:
         photo_points = []
         face_points = []
 
-        for i, photo_path in enumerate(photo_paths):
-            result = self.index_photo(photo_path)
+        # Embed the whole batch with batched vision forward passes;
+        # photos whose embedding failed come back as None
+        embeddings = self.embedding_generator.generate_embeddings_batch(
+            photo_paths, 
+            batch_size=self.batch_size
+        )
+
+        # Likewise detect faces for the whole batch, embedding all
+        # faces found in it with one recognition call
+        if self.enable_face_detection and self.face_detector:
+            faces_per_photo = self.face_detector.detect_faces_batch(photo_paths)
+        else:
+            faces_per_photo = [[] for _ in photo_paths]
+
+        for photo_path, embedding, detected_faces in zip(photo_paths, embeddings, faces_per_photo):
+            if embedding is None:
+                self.log.warn(f"Not indexing {photo_path.name}: no embedding")
+                continue
+            result = self.index_photo(photo_path,
+                                      embedding=embedding,
+                                      detected_faces=detected_faces)
 
             if result:
                 # Create Qdrant point for photo using GUID
@@ -420,28 +581,46 @@ class PhotoIndexer:
 
                 # Create face points if faces were detected
                 if result.get('detected_faces'):
-                    for face in result['detected_faces']:
-                        # Generate unique ID for this face (combine photo GUID and face index)
-                        face_id = Utils.guid_to_point_id(f"{guid}_face_{face.face_index}")
-
-                        face_point = PointStruct(
-                            id=face_id,
-                            vector=face.embedding.tolist(),
-                            payload={
-                                'photo_guid': guid,
-                                'photo_path': str(photo_path),
-                                'photo_filename': photo_path.name,
-                                'face_index': face.face_index,
-                                'bbox': face.bbox,
-                                'confidence': face.confidence,
-                                'person_name': None,  # To be tagged by user later
-                            }
-                        )
-
-                        face_points.append(face_point)
+                    face_points.extend(
+                        self.make_face_points(guid, photo_path, result['detected_faces']))
 
         return photo_points, face_points
     
+    @staticmethod
+    def make_face_points(guid: str,
+                         photo_path: Path,
+                         detected_faces: List[DetectedFace]) -> List[PointStruct]:
+        """Create the Qdrant points for a photo's detected faces.
+        
+        Args:
+            guid: GUID of the photo
+            photo_path: Path to the photo file
+            detected_faces: The photo's detected faces
+            
+        Returns:
+            One point per face for the faces collection
+        """
+        # Shared by all of the photo's face payloads
+        photo_path_str = str(photo_path)
+        photo_filename = photo_path.name
+        return [
+            PointStruct(
+                # Unique ID for this face (combine photo GUID and face index)
+                id=Utils.guid_to_point_id(f"{guid}_face_{face.face_index}"),
+                vector=face.embedding.tolist(),
+                payload={
+                    'photo_guid': guid,
+                    'photo_path': photo_path_str,
+                    'photo_filename': photo_filename,
+                    'face_index': face.face_index,
+                    'bbox': face.bbox,
+                    'confidence': face.confidence,
+                    'person_name': None,  # To be tagged by user later
+                }
+            )
+            for face in detected_faces
+        ]
+    
     def index_all(self, force_reindex: bool = False):
         """Index all photos in the photo directory.
         
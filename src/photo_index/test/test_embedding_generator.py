@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# @Author: Andreas Paepcke
+# @Date:   2025-12-09 11:02:17
+# @Last Modified by:   Andreas Paepcke
+# @Last Modified time: 2025-12-09 11:02:17
+
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+from PIL import Image
+import torch
+
+from photo_index.embedding_generator import EmbeddingGenerator
+
+
+class FakeImageProcessor:
+    '''
+    Stands in for Mllama's image processor. Like the real one, it
+    reads a list of lists as one sample per inner list, and a flat
+    list as a single sample holding all the images. Each image
+    becomes a one-tile 2x2 pixel grid; missing images are zeros.
+    '''
+    def __call__(self, images, return_tensors):
+        if not isinstance(images[0], list):
+            images = [images]
+        max_images = max(len(sample) for sample in images)
+        pixel_values = torch.zeros(len(images), max_images, 1, 3, 2, 2)
+        for b, sample in enumerate(images):
+            for i, image in enumerate(sample):
+                pixels = np.asarray(image.resize((2, 2)), dtype=np.float32) / 255
+                pixel_values[b, i, 0] = torch.from_numpy(pixels).permute(2, 0, 1)
+        return {
+            'pixel_values': pixel_values,
+            'aspect_ratio_ids': torch.ones(len(images), max_images, dtype=torch.long),
+            'aspect_ratio_mask': torch.ones(len(images), max_images, 1, dtype=torch.long)
+        }
+
+
+class FakeVisionModel:
+    '''
+    Stands in for the vision encoder: hidden states are the pixels,
+    shaped [batch, num_images, tiles, seq_len=3, hidden_dim=4].
+    '''
+    def __call__(self, pixel_values, aspect_ratio_ids, aspect_ratio_mask, **kwargs):
+        return (pixel_values.flatten(start_dim=4).float(),)
+
+
+class EmbeddingGeneratorTester(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory(dir='/tmp', prefix='embedding_generator_')
+        self.photos = []
+        for color in ('red', 'green', 'blue'):
+            photo = Path(self.tmp_dir.name) / f"{color}.png"
+            Image.new('RGB', (8, 8), color=color).save(photo)
+            self.photos.append(photo)
+
+        # Bypass __init__, which loads the real model:
+        self.generator = EmbeddingGenerator.__new__(EmbeddingGenerator)
+        self.generator.device = 'cpu'
+        self.generator.use_cuda = False
+        self.generator.log = MagicMock()
+        self.generator._decode_min_side = None
+        self.generator.processor = MagicMock(image_processor=FakeImageProcessor())
+        self.generator.vision_fwd = FakeVisionModel()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+# --------------------- Tests ------------------
+
+    def test_batch_embeds_each_image(self):
+        # Two chunks: a full one and a partial one
+        embeddings = self.generator.generate_embeddings_batch(self.photos, batch_size=2)
+        self.assertEqual(len(embeddings), len(self.photos))
+        for photo, embedding in zip(self.photos, embeddings):
+            self.assertIsNotNone(embedding)
+            np.testing.assert_allclose(embedding, self.generator.generate_embedding(photo))
+        # Each photo has its own embedding, not a blend of the batch:
+        for i in range(len(embeddings)):
+            for j in range(i + 1, len(embeddings)):
+                self.assertFalse(np.allclose(embeddings[i], embeddings[j]))
+
+    def test_preprocess_one_row_per_image(self):
+        images = [Image.open(photo).convert('RGB') for photo in self.photos]
+        inputs = self.generator._preprocess(images)
+        self.assertEqual(inputs['pixel_values'].shape[:2], (len(images), 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
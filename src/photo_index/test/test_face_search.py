@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# @Author: Andreas Paepcke
+# @Date:   2025-12-08 09:12:44
+# @Last Modified by:   Andreas Paepcke
+# @Last Modified time: 2025-12-08 09:12:44
+
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+import unittest
+
+import numpy as np
+
+from photo_index.face_search import FACE_RESULT_FIELDS, FaceSearcher
+
+
+class FakeQdrantClient:
+    '''
+    Stands in for QdrantClient: answers each query with one
+    face point, and records the batches it was sent.
+    '''
+    def __init__(self):
+        self.batches = []
+
+    def query_batch_points(self, collection_name, requests):
+        self.batches.append(requests)
+        payload = {field: f"{field}_value" for field in FACE_RESULT_FIELDS}
+        return [SimpleNamespace(points=[SimpleNamespace(payload=payload, score=0.9)])
+                for _ in requests]
+
+
+class FakeFaceDetector:
+    '''Finds one face in every photo, and counts detections.'''
+    def __init__(self):
+        self.detected = []
+
+    def detect_faces_batch(self, image_paths):
+        self.detected.extend(image_paths)
+        return [[SimpleNamespace(embedding=np.ones(512, dtype=np.float32))]
+                for _ in image_paths]
+
+
+class FaceSearchTester(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeQdrantClient()
+        self.detector = FakeFaceDetector()
+        self.searcher = FaceSearcher(self.client)
+        # Bypass the cached_property that loads the real detector:
+        self.searcher.__dict__['face_detector'] = self.detector
+
+# --------------------- Tests ------------------
+
+    def test_search_by_photos_cache(self):
+        with TemporaryDirectory(dir='/tmp', prefix='face_search_') as root:
+            photo = Path(root) / 'photo.jpg'
+            photo.write_bytes(b'photo content')
+
+            # Cache miss: detects, and queries Qdrant
+            results = self.searcher.search_by_photos([photo], [0])
+            self.assertEqual(len(self.detector.detected), 1)
+            self.assertEqual(len(self.client.batches), 1)
+            self.assertEqual(len(results), 1)
+            self.assertEqual(results[0][0]['photo_guid'], 'photo_guid_value')
+            self.assertEqual(results[0][0]['similarity_score'], 0.9)
+
+            # Cache hit: same results without detection or query
+            self.assertEqual(self.searcher.search_by_photos([photo], [0]), results)
+            self.assertEqual(self.searcher.search_by_photo(photo), results[0])
+            self.assertEqual(len(self.detector.detected), 1)
+            self.assertEqual(len(self.client.batches), 1)
+
+            # A face the photo does not have yields no results:
+            self.assertEqual(self.searcher.search_by_photos([photo], [1]), [[]])
+            self.assertEqual(len(self.client.batches), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
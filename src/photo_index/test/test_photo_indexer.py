@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# @Author: Andreas Paepcke
+# @Date:   2025-12-09 14:40:51
+# @Last Modified by:   Andreas Paepcke
+# @Last Modified time: 2025-12-09 14:40:51
+
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+from PIL import Image
+
+from common.utils import Utils
+from photo_index import photo_indexer
+from photo_index.face_detector import DetectedFace
+from photo_index.photo_indexer import PhotoIndexer
+
+
+class FakeEmbeddingGenerator:
+    '''
+    Gives every photo its own embedding, derived from its name,
+    and records the batches it was asked for.
+    '''
+    def __init__(self):
+        self.batches = []
+
+    def generate_embeddings_batch(self, image_paths, batch_size):
+        self.batches.append(list(image_paths))
+        return [self.embedding_for(path) for path in image_paths]
+
+    @staticmethod
+    def embedding_for(path):
+        return np.full(4, float(sum(path.name.encode())), dtype=np.float32)
+
+
+class FakeFaceDetector:
+    '''Finds one face in every photo.'''
+    def detect_faces_batch(self, image_paths):
+        return [[DetectedFace(embedding=np.ones(512, dtype=np.float32),
+                              bbox=[0, 0, 4, 4],
+                              confidence=0.9,
+                              face_index=0)]
+                for _ in image_paths]
+
+
+class PhotoIndexerTester(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory(dir='/tmp', prefix='photo_indexer_')
+        self.photos = []
+        for color in ('red', 'green', 'blue', 'white', 'black'):
+            photo = Path(self.tmp_dir.name) / f"{color}.png"
+            Image.new('RGB', (8, 8), color=color).save(photo)
+            self.photos.append(photo)
+
+        # Bypass __init__, which connects to Qdrant and loads models:
+        self.indexer = PhotoIndexer.__new__(PhotoIndexer)
+        self.indexer.batch_size = 2
+        self.indexer.log = MagicMock()
+        self.indexer.enable_geocoding = False
+        self.indexer.geocoder = None
+        self.indexer.enable_face_detection = True
+        self.indexer.face_detector = FakeFaceDetector()
+        self.indexer.embedding_generator = FakeEmbeddingGenerator()
+        self.indexer.exif_extractor = MagicMock()
+        self.indexer.exif_extractor.extract_exif.return_value = {
+            'camera_make': None, 'camera_model': None, 'date_taken': None,
+            'width': 8, 'height': 8, 'iso': None, 'focal_length': None,
+            'aperture': None, 'exposure_time': None, 'gps': {}, 'keywords': []
+        }
+        self.indexer.mac_metadata_extractor = MagicMock()
+        self.indexer.mac_metadata_extractor.extract_metadata.return_value = {}
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+# --------------------- Tests ------------------
+
+    def test_index_batch_indexes_every_photo(self):
+        # Hash directly, keeping the on-disk GUID cache out of the test:
+        with patch.object(photo_indexer, 'GEN_IMG_DESCRIPTIONS', 0), \
+             patch.object(Utils, 'get_photo_guid', Utils._hash_photo):
+            photo_points, face_points = self.indexer.index_batch(self.photos)
+
+        self.assertEqual(self.indexer.embedding_generator.batches, [self.photos])
+
+        # One point per photo, each with its own embedding
+        self.assertEqual(len(photo_points), len(self.photos))
+        self.assertEqual(len({point.id for point in photo_points}), len(self.photos))
+        for photo, point in zip(self.photos, photo_points):
+            self.assertEqual(point.payload['file_path'], str(photo))
+            self.assertEqual(point.vector,
+                             FakeEmbeddingGenerator.embedding_for(photo).tolist())
+
+        # And each photo's face
+        self.assertEqual(len(face_points), len(self.photos))
+        self.assertEqual({point.payload['photo_path'] for point in face_points},
+                         {str(photo) for photo in self.photos})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -24,7 +24,8 @@ from qdrant_client.models import (
 from photo_index.embedding_generator import EmbeddingGenerator
 from common.utils import Utils
 from common.config import (
-    QDRANT_PATH, QDRANT_HOST, QDRANT_PORT, COLLECTION_NAME, MODEL_PATH, DEVICE
+    QDRANT_PATH, QDRANT_HOST, QDRANT_PORT, QDRANT_GRPC_PORT, COLLECTION_NAME,
+    MODEL_PATH, DEVICE
 )
 
 
@@ -56,7 +57,14 @@ class PhotoSearch:
         if qdrant_host and qdrant_port:
             try:
                 print(f"Attempting to connect to Qdrant server: {qdrant_host}:{qdrant_port}")
-                self.client = QdrantClient(host=qdrant_host, port=qdrant_port)
+                # gRPC sends query vectors as packed floats rather
+                # than JSON number lists
+                self.client = QdrantClient(
+                    host=qdrant_host,
+                    port=qdrant_port,
+                    grpc_port=QDRANT_GRPC_PORT,
+                    prefer_grpc=True
+                )
                 # Test connection
                 self.client.get_collections()
                 print(f"✓ Connected to Qdrant server")
@@ -83,9 +91,11 @@ class PhotoSearch:
         """Lazy load the embedding generator."""
         if self._embedding_generator is None:
             print("Loading vision model...")
+            # Search only embeds images, so skip the language model
             self._embedding_generator = EmbeddingGenerator(
                 self._model_path,
-                self._device
+                self._device,
+                mode="embed"
             )
         return self._embedding_generator
     